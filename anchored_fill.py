@@ -0,0 +1,76 @@
+"""Anchored GLR fill: the model returns JSON keyed by template anchor IDs
+
+Positional filling maps the i-th output line onto the i-th template
+paragraph, so one added or dropped line shifts everything after it. Here
+every paragraph and table cell carries a stable ID and the model answers
+with {"ID": "text"}; unknown IDs are ignored and missing ones keep the
+template text.
+"""
+import json
+import re
+
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+def template_anchors(template, template_structure):
+    """Fillable anchors as {"id", "type", "text"} dicts: paragraphs, table cells, then blank value cells
+
+    template_structure is the output of analyze_template_structure for the
+    same ParsedTemplate, so anchors share its IDs and types. Blank cells
+    right of or below a cell with text, such as the value cell beside
+    "Roof Type", follow as CONTENT anchors with empty text.
+    """
+    lines = list(template.paragraphs) + list(template.cells)
+    anchors = [
+        {"id": entry["id"], "type": entry["type"], "text": line.text.strip()}
+        for entry, line in zip(template_structure, lines)
+    ]
+    return anchors + [{"id": cell.anchor, "type": "CONTENT", "text": ""} for cell in template.blank_cells()]
+
+
+def build_anchor_prompt(structure_analysis, anchors, report_evidence):
+    """Prompt asking for a JSON object that maps anchor IDs to completed text"""
+    anchor_lines = "\n".join(f"{a['id']}: [{a['type']}] {a['text'] or '(empty)'}" for a in anchors)
+    return f"""You are an expert insurance claims adjuster. You must complete a General Loss Report (GLR) based on a template and photo inspection reports.
+
+YOUR UNDERSTANDING OF THE TEMPLATE STRUCTURE:
+{structure_analysis}
+
+TEMPLATE LINES AND TABLE CELLS (ID: [TYPE] text):
+{anchor_lines}
+
+PHOTO INSPECTION REPORTS (your source data):
+{report_evidence}
+
+YOUR TASK:
+Complete the report by giving the new text for each template line or table cell that must change:
+1. Fill in ALL placeholders with actual data from the photo reports, writing values into (empty) table cells rather than over the label next to them
+2. Replace instructional text in parentheses with actual values
+3. Write detailed, professional descriptions of damage with specific counts, locations and measurements
+4. Extract the CORRECT date of loss from the reports (not the inspection date)
+5. For sections with no data (like Supplement, Priors), write "N/A" or an appropriate professional response
+
+CRITICAL RULES:
+- Use ONLY the IDs listed above, exactly as written
+- Omit IDs whose text stays the same, such as section headers
+- Each value is the complete replacement text for that one line or cell, without line breaks
+
+Return ONLY a JSON object such as {{"p3": "March 4, 2024", "t0r1c1": "Asphalt shingle"}} with no other text."""
+
+
+def parse_anchor_response(text, anchor_ids):
+    """Dict of anchor ID -> text from a model response; raises ValueError if there is no JSON object"""
+    text = _FENCE.sub("", text.strip())
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        raise ValueError("Response did not contain a JSON object")
+    values = json.loads(text[start:end + 1])
+    if not isinstance(values, dict):
+        raise ValueError("Response JSON is not an object")
+
+    known = set(anchor_ids)
+    return {
+        key: " ".join(str(value).split())
+        for key, value in values.items()
+        if key in known and value is not None
+    }
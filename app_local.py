@@ -1,131 +1,24 @@
 import streamlit as st
 import os
 from pathlib import Path
-import tempfile
-from docx import Document
-import PyPDF2
-import requests
 import json
+import uuid
+
+from settings import FILL_MODES, FILL_SINGLE, default_workers
+from startup import load_engine
 
 # Load environment variables
 from dotenv import load_dotenv
 load_dotenv()
 
-# Configure page
-st.set_page_config(page_title="GLR Pipeline (Local)", layout="wide")
-
-def extract_text_from_pdf(pdf_file):
-    """Extract text from PDF file"""
-    try:
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-        return text
-    except Exception as e:
-        st.error(f"Error extracting PDF: {str(e)}")
-        return ""
 
-def call_llm(prompt, api_key):
-    """Call Groq API"""
-    url = "https://api.groq.com/openai/v1/chat/completions"
-    
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    
-    data = {
-        "model": "llama-3.3-70b-versatile",
-        "messages": [
-            {"role": "user", "content": prompt}
-        ],
-        "temperature": 0.2,
-        "max_tokens": 8000
-    }
-    
-    try:
-        response = requests.post(url, headers=headers, json=data)
-        response.raise_for_status()
-        return response.json()["choices"][0]["message"]["content"]
-    except Exception as e:
-        st.error(f"LLM API Error: {str(e)}")
-        return None
-
-def extract_template_content(doc_path):
-    """Extract full template as text"""
-    doc = Document(doc_path)
-    full_text = []
-    
-    for para in doc.paragraphs:
-        if para.text.strip():
-            full_text.append(para.text)
-    
-    for table in doc.tables:
-        for row in table.rows:
-            row_text = []
-            for cell in row.cells:
-                if cell.text.strip():
-                    row_text.append(cell.text)
-            if row_text:
-                full_text.append(" | ".join(row_text))
-    
-    return "\n".join(full_text)
+@st.cache_resource(show_spinner="Loading the pipeline...")
+def load_pipeline():
+    """Heavy libraries and the pipeline, imported and warmed up once per process"""
+    return load_engine()
 
-def analyze_template_structure(doc_path):
-    """Analyze template structure and formatting"""
-    doc = Document(doc_path)
-    structure = []
-    
-    for i, para in enumerate(doc.paragraphs):
-        if para.text.strip():
-            style = para.style.name if para.style else "Normal"
-            text = para.text.strip()
-            
-            if text.endswith(':'):
-                para_type = "LABEL"
-            elif text.isupper() or any(word in text for word in ["Dwelling", "Roof", "Elevation", "Interior", "Contents", "Review"]):
-                para_type = "HEADER"
-            elif text.startswith('(') and text.endswith(')'):
-                para_type = "INSTRUCTION"
-            else:
-                para_type = "CONTENT"
-            
-            structure.append({
-                "index": i,
-                "type": para_type,
-                "style": style,
-                "text": text[:100]
-            })
-    
-    return structure
-
-def populate_template_smart(template_path, filled_content):
-    """Populate template preserving ALL formatting"""
-    doc = Document(template_path)
-    
-    new_paragraphs = [p.strip() for p in filled_content.split('\n') if p.strip()]
-    
-    template_paragraphs = []
-    for para in doc.paragraphs:
-        if para.text.strip():
-            template_paragraphs.append(para)
-    
-    for i, para in enumerate(template_paragraphs):
-        if i < len(new_paragraphs):
-            for run in para.runs:
-                run.text = ""
-            
-            if para.runs:
-                para.runs[0].text = new_paragraphs[i]
-            else:
-                para.add_run(new_paragraphs[i])
-    
-    if len(new_paragraphs) > len(template_paragraphs):
-        for i in range(len(template_paragraphs), len(new_paragraphs)):
-            doc.add_paragraph(new_paragraphs[i])
-    
-    return doc
+# Configure page
+st.set_page_config(page_title="GLR Pipeline (Local)", layout="wide")
 
 # Main UI
 st.title("GLR Pipeline - Insurance Template Automation (Local Testing)")
@@ -152,6 +45,27 @@ with st.sidebar:
         if api_key:
             st.success("✅ API Key entered")
     
+    pdf_workers = st.number_input(
+        "PDF extraction workers",
+        min_value=1,
+        max_value=64,
+        value=min(default_workers(), 64),
+        help="Processes used to extract report pages in parallel (1 = serial)"
+    )
+    fill_mode = st.radio(
+        "Fill mode",
+        FILL_MODES,
+        help="Section-wise sends one smaller prompt per template section with only the relevant report pages, "
+                 "and on a re-run regenerates only the sections whose reports changed; "
+             "Anchored asks for JSON keyed by template line and table cell, so a missing line cannot shift the rest"
+    )
+    stream_output = st.checkbox(
+        "Stream LLM output",
+        value=True,
+        disabled=fill_mode != FILL_SINGLE,
+        help="Fill the template and preview the report while the model is still generating (single prompt mode)"
+    )
+    
     st.markdown("---")
     st.markdown("### 📖 Instructions")
     st.markdown("1. **Enter your Groq API key** (or set GROQ_API_KEY in .env)")
@@ -180,139 +94,129 @@ with col2:
     if photo_reports:
         st.success(f"{len(photo_reports)} report(s) uploaded")
 
+# The engine loads after the page above has rendered; later reruns find it cached
+startup_report = load_pipeline()
+from doc_cache import get_cache
+from docx_io import DOCX_MIME
+from jobs import DONE, FAILED, get_job_queue
+from llm_cache import get_response_cache
+from llm_router import get_router
+from llm_scheduler import LANE_BATCH, LANE_INTERACTIVE, get_scheduler
+from template_registry import get_template_registry
+
 # Process button
 st.markdown("---")
 if st.button("🚀 Process Documents", type="primary", disabled=not (template_file and photo_reports and api_key), use_container_width=True):
-    
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    
     try:
-        # Save template
-        status_text.text("Loading template...")
-        progress_bar.progress(10)
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.docx') as tmp_template:
-            tmp_template.write(template_file.read())
-            template_path = tmp_template.name
-        
-        # Analyze template
-        status_text.text("Analyzing template structure...")
-        progress_bar.progress(15)
-        template_content = extract_template_content(template_path)
-        template_structure = analyze_template_structure(template_path)
-        
-        structure_summary = "\n".join([
-            f"Line {s['index']}: [{s['type']}] {s['text'][:50]}..." 
-            for s in template_structure[:30]
-        ])
-        
-        # Extract from photo reports
-        status_text.text(f"Extracting from {len(photo_reports)} report(s)...")
-        progress_bar.progress(35)
-        all_report_text = ""
-        for i, pdf_file in enumerate(photo_reports):
-            report_text = extract_text_from_pdf(pdf_file)
-            all_report_text += f"\n\n=== REPORT {i+1}: {pdf_file.name} ===\n{report_text}"
-        
-        # AI learns structure
-        status_text.text("AI learning template structure...")
-        progress_bar.progress(50)
-        
-        structure_prompt = f"""You are analyzing an insurance GLR template structure.
-
-TEMPLATE STRUCTURE:
-{structure_summary}
-
-FULL TEMPLATE CONTENT:
-{template_content[:4000]}
-
-Analyze this template and identify:
-1. What sections exist
-2. What information needs to be filled
-3. What instructional text needs to be replaced
-4. The order and hierarchy of sections
-
-Respond with a brief analysis."""
+        # Runs in the background so reruns and other users are never blocked
+        job_id = get_job_queue().submit(
+            template_file,
+            [(pdf_file.name, pdf_file) for pdf_file in photo_reports],
+            api_key,
+            fill_mode=fill_mode,
+            stream=stream_output,
+            pdf_workers=pdf_workers,
+            # Re-running the claim reuses sections whose reports did not change
+            previous_job=(st.session_state.get("jobs") or [None])[-1],
+            # Each browser session gets a fair share of the shared LLM quota
+            tenant=st.session_state.setdefault("tenant", uuid.uuid4().hex),
+            # Claims queued behind this session's unfinished ones wait behind other sessions' first claims
+            lane=LANE_BATCH if get_job_queue().active(st.session_state.get("jobs") or []) else LANE_INTERACTIVE
+        )
+        st.session_state.setdefault("jobs", []).append(job_id)
+    except Exception as e:
+        st.error(f"❌ Error: {str(e)}")
 
-        structure_analysis = call_llm(structure_prompt, api_key)
+def show_job(job_id):
+    """Status, progress and download for one background job"""
+    job = get_job_queue().get(job_id)
+    if job is None:
+        st.caption(f"Job {job_id[:8]} has expired")
+        return
+    
+    st.progress(job["progress"], text=f"Job {job_id[:8]}: {job['message']}")
+    for error in job["errors"]:
+        st.error(f"❌ {error}")
+    
+    if job["metrics"].get("stages"):
+        with st.expander("📊 Performance"):
+            st.caption(f"Total: {job['metrics']['total_seconds']:.2f}s")
+            st.dataframe(job["metrics"]["stages"], use_container_width=True)
+    
+    if job["status"] == DONE:
+        st.success("🎉 Document completed!")
         
-        # Generate content
-        status_text.text("Generating completed report...")
-        progress_bar.progress(65)
+        # Download
+        st.markdown("### 📥 Download Your Completed Report")
+        st.download_button(
+            label="⬇️ Download Completed GLR Report (DOCX)",
+            data=get_job_queue().output(job_id),
+            file_name=job["output_name"],
+            mime=DOCX_MIME,
+            type="primary",
+            use_container_width=True,
+            key=f"download_{job_id}"
+        )
         
-        prompt = f"""You are an expert insurance claims adjuster. Complete this GLR based on template and reports.
-
-YOUR UNDERSTANDING:
-{structure_analysis}
-
-TEMPLATE:
-{template_content}
-
-PHOTO REPORTS:
-{all_report_text[:12000]}
-
-YOUR TASK:
-Rewrite the ENTIRE GLR by:
-1. Filling ALL placeholders with actual data
-2. DELETING instructional text in parentheses and replacing with actual values
-3. DELETING template instructions
-4. Writing detailed, professional descriptions
-5. Including specific measurements and details
-6. Using proper insurance language
-
-CRITICAL:
-- MAINTAIN EXACT SAME STRUCTURE as template
-- Extract CORRECT date of loss from reports
-- Include full addresses
-- Be specific about damage
-- Delete ALL instructions
-- For sections with no data, write "N/A"
-- Keep section headers exactly as in template
-- One paragraph per line
+        # Preview
+        with st.expander("📄 Preview Generated Report"):
+            st.text(job["preview"])
+    elif job["status"] == FAILED:
+        st.error("❌ Failed to generate report")
+    elif job["preview"]:
+        st.text(job["preview"])
+
+def show_jobs():
+    """Newest job first; polled while the page is open"""
+    for job_id in reversed(st.session_state.get("jobs", [])):
+        show_job(job_id)
+
+if hasattr(st, "fragment"):
+    show_jobs = st.fragment(run_every=2)(show_jobs)
+elif st.session_state.get("jobs"):
+    st.button("🔄 Refresh job status")
+
+show_jobs()
 
-Return COMPLETE filled report as plain text."""
-
-        llm_response = call_llm(prompt, api_key)
-        progress_bar.progress(90)
-        
-        if llm_response:
-            # Create document
-            status_text.text("Creating document...")
-            filled_doc = populate_template_smart(template_path, llm_response)
-            
-            # Save
-            output_path = tempfile.NamedTemporaryFile(delete=False, suffix='.docx').name
-            filled_doc.save(output_path)
-            
-            st.success("🎉 Document completed!")
-            
-            # Download
-            st.markdown("### 📥 Download Your Completed Report")
-            with open(output_path, 'rb') as f:
-                st.download_button(
-                    label="⬇️ Download Completed GLR Report (DOCX)",
-                    data=f.read(),
-                    file_name="completed_glr_report.docx",
-                    mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                    type="primary",
-                    use_container_width=True
-                )
-            
-            # Preview
-            with st.expander("📄 Preview Generated Report"):
-                st.text(llm_response[:2000] + "..." if len(llm_response) > 2000 else llm_response)
-            
-            progress_bar.progress(100)
-            status_text.text("✅ Complete!")
-            
-            # Cleanup
-            os.unlink(template_path)
-            os.unlink(output_path)
-        else:
-            st.error("❌ Failed to generate report")
-    
-    except Exception as e:
-        st.error(f"❌ Error: {str(e)}")
+with st.sidebar:
+    cache_stats = get_cache().stats()
+    st.markdown("---")
+    st.caption(
+        f"📦 Parse cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses · "
+        f"{cache_stats['entries']} entries ({cache_stats['bytes'] / 1024 / 1024:.1f} MB)"
+    )
+    llm_stats = get_response_cache().stats()
+    st.caption(
+        f"🧠 LLM cache: {llm_stats['hits']} hits / {llm_stats['misses']} misses · "
+        f"{llm_stats['coalesced']} shared in-flight · {llm_stats['entries']} entries"
+    )
+    st.caption("🔀 LLM backends: " + " · ".join(
+        f"{b['name']} ({'healthy' if b['healthy'] else 'cooling down'}"
+        + (f", {b['latency_seconds']:.1f}s" if b['latency_seconds'] is not None else "")
+        + (f", {b['failures']} failed" if b['failures'] else "") + ")"
+        for b in get_router().stats()
+    ))
+    queue_stats = get_scheduler().stats()
+    st.caption(
+        f"🚦 LLM queue: {sum(queue_stats['queued'].values())} waiting "
+        f"({queue_stats['tenants_waiting']} sessions) · {queue_stats['in_flight']} in flight · "
+        f"avg wait {queue_stats['avg_wait_seconds']['interactive']:.1f}s"
+    )
+    registry_stats = get_template_registry().stats()
+    st.caption(
+        f"📐 Templates: {registry_stats['entries']} analyzed ({registry_stats['in_use']} in use) · "
+        f"{registry_stats['hits']} shared / {registry_stats['misses']} new"
+    )
+    job_counts = get_job_queue().counts()
+    st.caption(
+        f"⏳ Jobs: {job_counts.get('queued', 0)} queued · {job_counts.get('running', 0)} running · "
+        f"{job_counts.get('done', 0)} ready for download"
+    )
+    st.caption(
+        f"🚀 Startup: pipeline loaded in {startup_report['total_seconds']:.2f}s "
+        f"(imports {sum(step['seconds'] for step in startup_report['imports']):.2f}s · "
+        f"warm-up {sum(step['seconds'] for step in startup_report['warm_ups']):.2f}s)"
+    )
 
 st.markdown("---")
 st.markdown("Built with Streamlit • Powered by Llama 3.3 70B via Groq")
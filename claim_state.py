@@ -0,0 +1,74 @@
+"""Per-claim record of what each generated section was built from
+
+Adjusters often add one more photo report to a claim and process it again.
+ClaimState remembers, for every template section of the last section-wise
+run, the text generated for it and the report pages (by report content
+hash) that matched it. On the next run a section is regenerated only when
+one of those reports was removed or changed, or when a report the claim
+did not have before now matches it; every other section keeps its text.
+"""
+import json
+import os
+
+
+class ClaimState:
+    """Section texts and their source pages from a claim's previous run"""
+
+    def __init__(self, template_hash=None, reports=(), sections=()):
+        self.template_hash = template_hash
+        self.reports = list(reports)
+        # One {"sources": [[report_hash, page], ...], "text": str or None} per template section
+        self.sections = list(sections)
+
+    def reusable(self, template_hash, report_hashes, section_sources):
+        """Previous text for each section whose sources are unchanged, else None
+
+        section_sources[i] lists the (report_hash, page) pairs that matched
+        section i in this run.
+        """
+        if template_hash != self.template_hash or len(section_sources) != len(self.sections):
+            return [None] * len(section_sources)
+        previous_reports = set(self.reports)
+        current_reports = set(report_hashes)
+        texts = []
+        for previous, sources in zip(self.sections, section_sources):
+            unchanged = (
+                all(report_hash in current_reports for report_hash, _ in previous["sources"])
+                and all(report_hash in previous_reports for report_hash, _ in sources)
+            )
+            texts.append(previous["text"] if unchanged else None)
+        return texts
+
+    def update(self, template_hash, report_hashes, section_sources, outputs):
+        """Record this run's sections; failed sections are left to be regenerated next time"""
+        self.template_hash = template_hash
+        self.reports = list(report_hashes)
+        self.sections = [
+            {"sources": [list(source) for source in sources], "text": text}
+            for sources, text in zip(section_sources, outputs)
+        ]
+
+    def to_dict(self):
+        return {"template_hash": self.template_hash, "reports": self.reports, "sections": self.sections}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get("template_hash"), data.get("reports", ()), data.get("sections", ()))
+
+    @classmethod
+    def load(cls, path):
+        """State saved at path, or an empty state if there is none or it is unreadable"""
+        if not path or not os.path.exists(path):
+            return cls()
+        try:
+            with open(path, encoding="utf-8") as f:
+                return cls.from_dict(json.load(f))
+        except (OSError, ValueError):
+            return cls()
+
+    def save(self, path):
+        """Write the state atomically"""
+        partial = path + ".partial"
+        with open(partial, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(partial, path)
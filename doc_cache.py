@@ -0,0 +1,105 @@
+"""Persistent content-addressed cache for extracted PDF text and parsed templates"""
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+# Bump when extraction or analysis output changes so stale entries are ignored
+CACHE_VERSION = 2
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "glr-pipeline")
+DEFAULT_MAX_MB = 512
+
+
+def content_hash(data):
+    """SHA-256 hex digest of file bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class DocumentCache:
+    """SQLite-backed cache of pickled values with size-bounded LRU eviction"""
+
+    def __init__(self, path=None, max_bytes=None):
+        if path is None:
+            cache_dir = os.getenv("GLR_CACHE_DIR", DEFAULT_CACHE_DIR)
+            os.makedirs(cache_dir, exist_ok=True)
+            path = os.path.join(cache_dir, "documents.sqlite3")
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv("GLR_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_access)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def _key(kind, digest):
+        return f"v{CACHE_VERSION}:{kind}:{digest}"
+
+    def get(self, kind, digest):
+        """Return the cached value for (kind, digest), or None on a miss"""
+        key = self._key(kind, digest)
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+        return pickle.loads(row[0])
+
+    def put(self, kind, digest, value):
+        """Store a picklable value and evict least recently used entries"""
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_bytes:
+            return
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (self._key(kind, digest), blob, len(blob), time.time())
+            )
+            self._evict(conn)
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall():
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self):
+        """Hit/miss counters for this process plus on-disk usage"""
+        with self._lock, self._connect() as conn:
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Process-wide cache shared by all Streamlit sessions"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DocumentCache()
+        return _cache
@@ -0,0 +1,89 @@
+"""In-memory .docx input and output
+
+Templates are read once into memory and parsed from a BytesIO, and filled
+documents are serialized into a buffer, so the app can serve downloads and
+the batch can stream many reports into one ZIP archive without writing
+and re-reading temporary files. Anything that does go to disk is written
+atomically and cleaned up when the write fails.
+"""
+import os
+import threading
+import zipfile
+from io import BytesIO
+
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+
+def read_docx(source):
+    """Bytes of a .docx given as bytes, a binary file object or a path"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    if hasattr(source, "read"):
+        # Streamlit uploads may already have been read once this script run
+        if hasattr(source, "seek"):
+            source.seek(0)
+        return source.read()
+    with open(source, "rb") as f:
+        return f.read()
+
+
+def document_bytes(doc):
+    """Serialize a python-docx Document without touching the disk"""
+    buffer = BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def write_atomic(path, data):
+    """Write bytes via a sibling .partial file and rename, removing it if anything fails"""
+    partial = f"{path}.partial"
+    try:
+        with open(partial, "wb") as f:
+            f.write(data)
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    return len(data)
+
+
+def save_document(doc, path):
+    """Write a Document to path atomically; returns the bytes written"""
+    return write_atomic(path, document_bytes(doc))
+
+
+class DocxZipWriter:
+    """Stream filled documents into one ZIP archive as they are produced
+
+    target is a path or a writable binary stream, which need not be
+    seekable (stdout works); label names it in batch records and defaults
+    to the path. Members are stored, not deflated, since a .docx is already
+    compressed. Safe to call add() from several threads.
+    """
+
+    def __init__(self, target, label=None):
+        self.label = label or str(target)
+        self._zip = zipfile.ZipFile(target, "w", compression=zipfile.ZIP_STORED)
+        self._lock = threading.Lock()
+        self.names = []
+
+    def add(self, name, data):
+        with self._lock:
+            self._zip.writestr(name, data)
+            self.names.append(name)
+        return len(data)
+
+    def add_document(self, name, doc):
+        """Add a Document as name; returns the bytes written"""
+        return self.add(name, document_bytes(doc))
+
+    def close(self):
+        with self._lock:
+            self._zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,483 @@
+"""Rule-based extraction of structured claim fields from report text
+
+Dates, addresses, policy and claim numbers, measurements and counts are
+printed by the inspection tools as "Label: value" lines or table rows, so
+compiled rules read them in milliseconds instead of leaving them to the
+fill model. Each field becomes an ExtractedField with a typed value and a
+confidence: a labeled value scores higher than one recognised by its format
+alone, agreement across reports raises the score and conflicting values
+lower it.
+
+template_slots() finds the template lines and table cells that ask for one
+of these fields, such as "Date of Loss:" or a "Policy #" cell, once per
+template version. prefill() turns the fields at or above
+GLR_FIELD_MIN_CONFIDENCE into anchor ID -> text values that the pipeline
+writes into the report itself, so the model only has to write the
+narrative. To see what the rules find in a report:
+
+    python field_extract.py report.pdf [--json]
+"""
+import argparse
+import calendar
+import json
+import os
+import re
+import sys
+import threading
+from datetime import date
+
+from template_model import TemplateCell
+
+# Street, city, two-letter state and ZIP on one line
+_STREET_ADDRESS = r"\b\d{1,6}\s+[A-Za-z0-9.' #-]+?,\s*[A-Za-z.' -]+?,?\s+[A-Z]{2}\.?\s+\d{5}(?:-\d{4})?\b"
+
+DATE = "date"
+IDENTIFIER = "identifier"
+NAME = "name"
+ADDRESS = "address"
+AREA = "area"
+PITCH = "pitch"
+COUNT = "count"
+YEAR = "year"
+
+# "label" is matched case-insensitively as a whole word; "shape" optionally
+# finds the value without a label, in its "value" group. Labels of all rules
+# are tried in this order, so a short label that starts a longer one of a
+# later rule must rule it out, as policy does for policy holder
+FIELD_RULES = (
+    {"name": "date_of_loss", "type": DATE, "label": r"date\s+of\s+loss|loss\s+date|d\.?o\.?l\.?"},
+    {"name": "inspection_date", "type": DATE,
+     "label": r"date\s+of\s+inspection|inspection\s+date|date\s+inspected|inspected\s+on"},
+    {"name": "policy_number", "type": IDENTIFIER, "label": r"policy\s*(?:number|no\.?|#)|policy(?!\s*holder)"},
+    {"name": "claim_number", "type": IDENTIFIER, "label": r"claim\s*(?:number|no\.?|#)|claim"},
+    {"name": "insured", "type": NAME,
+     "label": r"(?:name\s+of\s+)?insured(?:'s)?(?:\s+name)?(?!\s+address)|policy\s*holder|homeowner"},
+    {"name": "address", "type": ADDRESS,
+     "label": r"(?:property|loss|risk|insured)\s+address|address|(?:property|loss|risk)\s+location|location\s+of\s+loss",
+     "shape": rf"(?P<value>{_STREET_ADDRESS})"},
+    {"name": "roof_area", "type": AREA,
+     "label": r"(?:total\s+)?roof\s+(?:area|size|squares)|total\s+squares"},
+    {"name": "roof_pitch", "type": PITCH, "label": r"(?:roof\s+)?(?:pitch|slope)",
+     "shape": r"(?i:(?P<value>\b\d{1,2}\s*/\s*12)\s+(?:pitch|slope)\b)"},
+    {"name": "stories", "type": COUNT, "label": r"(?:number\s+of\s+)?(?:stories|floors)",
+     "shape": r"(?i:(?P<value>\b(?:one|two|three|[1-4]))[- ]stor(?:y|ies)\b)"},
+    {"name": "year_built", "type": YEAR, "label": r"year\s+built|built\s+in"},
+    {"name": "hail_hits", "type": COUNT,
+     "label": r"hail\s+(?:hits|strikes|impacts)(?:\s+per\s+(?:test\s+)?square)?",
+     "shape": r"(?i:(?P<value>\b\d{1,3})\s+hail\s+(?:hits|strikes|impacts)\b)"},
+)
+
+# Confidence of one mention, by how the value was found
+LABELED = 0.9
+TABLE = 0.85
+NEXT_LINE = 0.75
+UNSEPARATED = 0.7
+SHAPE = 0.55
+# Added for each further report that agrees
+AGREEMENT = 0.05
+MAX_CONFIDENCE = 0.99
+DEFAULT_MIN_CONFIDENCE = 0.8
+
+_MONTHS = {name.lower(): n for n, name in enumerate(calendar.month_name) if name}
+_MONTHS.update({name.lower(): n for n, name in enumerate(calendar.month_abbr) if name})
+_MONTHS["sept"] = 9
+_DATE = re.compile(
+    r"(?P<iy>\d{4})-(?P<im>\d{1,2})-(?P<id>\d{1,2})\b"
+    r"|(?P<m>\d{1,2})[/.-](?P<d>\d{1,2})[/.-](?P<y>\d{4}|\d{2})\b"
+    r"|(?P<mn>[A-Za-z]{3,9})\.?\s+(?P<md>\d{1,2})(?:st|nd|rd|th)?,?\s+(?P<my>\d{4})\b"
+    r"|(?P<dd>\d{1,2})(?:st|nd|rd|th)?\s+(?P<dm>[A-Za-z]{3,9})\.?,?\s+(?P<dy>\d{4})\b"
+)
+_IDENTIFIER = re.compile(r"[A-Za-z0-9][A-Za-z0-9/.-]{3,29}(?![A-Za-z0-9])")
+# Words separated by single spaces, stopping at a column gap or the next "Word:" label
+_NAME_WORD = r"[A-Za-z][A-Za-z.'&-]*(?![A-Za-z.'&-])(?![ \t]*:)"
+_NAME = re.compile(rf"{_NAME_WORD}(?:[ ]{_NAME_WORD}){{0,7}}")
+_ADDRESS = re.compile(_STREET_ADDRESS)
+_CITY_LINE = re.compile(r"[A-Za-z.' -]+,?\s+[A-Z]{2}\.?\s+\d{5}(?:-\d{4})?")
+_AREA = re.compile(r"(?P<n>\d[\d,]*(?:\.\d+)?)\s*(?P<u>squares?|sq\.?\s*ft\.?|square\s+feet|sf|sq)\b", re.IGNORECASE)
+_PITCH = re.compile(r"(?P<rise>\d{1,2})\s*/\s*12\b")
+_COUNT = re.compile(r"(?P<n>\d{1,4}|one|two|three|four|five|six|seven|eight|nine|ten)\b", re.IGNORECASE)
+_NUMBER_WORDS = {word: n for n, word in enumerate(
+    ("zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten"))}
+_YEAR = re.compile(r"(?P<y>1[89]\d{2}|20\d{2})\b")
+# Cells of a table row printed on one line
+_COLUMNS = re.compile(r"\t+|\s*\|\s*|\s{2,}")
+# Template text that only stands in for a value: blanks, brackets, mm/dd/yyyy
+_BRACKETED = re.compile(r"\([^)]*\)|\[[^\]]*\]|<[^>]*>|\{[^}]*\}")
+_PLACEHOLDER = re.compile(r"(?i:[\s_.:/\-–—]|x+\b|mm|dd|yy(?:yy)?|tbd|n/?a\b)*")
+
+
+def _parse_date(text):
+    m = _DATE.match(text)
+    if not m:
+        return None
+    try:
+        if m.group("iy"):
+            value = date(int(m.group("iy")), int(m.group("im")), int(m.group("id")))
+        elif m.group("y"):
+            year = int(m.group("y"))
+            if year < 100:
+                year += 2000 if year < 70 else 1900
+            value = date(year, int(m.group("m")), int(m.group("d")))
+        else:
+            month = _MONTHS.get((m.group("mn") or m.group("dm")).lower())
+            if month is None:
+                return None
+            value = date(int(m.group("my") or m.group("dy")), month, int(m.group("md") or m.group("dd")))
+    except ValueError:
+        return None
+    return value, f"{value:%B} {value.day}, {value.year}", 1.0
+
+
+def _parse_identifier(text):
+    m = _IDENTIFIER.match(text)
+    if not m:
+        return None
+    value = m.group().rstrip("./-").upper()
+    if len(value) < 4 or not any(c.isdigit() for c in value) or _DATE.fullmatch(value):
+        return None
+    return value, value, 1.0
+
+
+def _parse_name(text):
+    m = _NAME.match(text)
+    if not m or len(m.group()) < 3:
+        return None
+    value = " ".join(m.group().split())
+    return value, value, 1.0
+
+
+def _parse_address(text, next_line=""):
+    text = " ".join(text.split()).rstrip(",")
+    if not text[:1].isdigit() or not any(c.isalpha() for c in text):
+        return None
+    m = _ADDRESS.match(text)
+    if m:
+        return m.group(), m.group(), 1.0
+    if not re.search(r"\b\d{5}(?:-\d{4})?$", text):
+        # Street on this line and "City, ST 12345" on the next
+        city = " ".join(next_line.split())
+        if _CITY_LINE.fullmatch(city):
+            text = f"{text}, {city}"
+        else:
+            return text, text, 0.8
+    return text, text, 1.0
+
+
+def _parse_area(text):
+    m = _AREA.match(text)
+    if not m:
+        return None
+    value = float(m.group("n").replace(",", ""))
+    unit = "sq ft" if "f" in m.group("u").lower() else "squares"
+    return (value, unit), f"{value:,g} {unit}", 1.0
+
+
+def _parse_pitch(text):
+    m = _PITCH.match(text)
+    if not m:
+        return None
+    value = f"{int(m.group('rise'))}/12"
+    return value, value, 1.0
+
+
+def _parse_count(text):
+    m = _COUNT.match(text)
+    if not m:
+        return None
+    word = m.group("n").lower()
+    value = _NUMBER_WORDS[word] if word in _NUMBER_WORDS else int(word)
+    return value, str(value), 1.0
+
+
+def _parse_year(text):
+    m = _YEAR.match(text)
+    if not m:
+        return None
+    value = int(m.group("y"))
+    return value, str(value), 1.0
+
+
+_PARSERS = {
+    DATE: _parse_date,
+    IDENTIFIER: _parse_identifier,
+    NAME: _parse_name,
+    ADDRESS: _parse_address,
+    AREA: _parse_area,
+    PITCH: _parse_pitch,
+    COUNT: _parse_count,
+    YEAR: _parse_year,
+}
+
+
+def _key(value):
+    """Values that count as the same answer when comparing mentions"""
+    if isinstance(value, str):
+        return re.sub(r"[^a-z0-9]+", "", value.lower())
+    return value
+
+
+def is_placeholder(text):
+    """True when template text only stands in for a value, e.g. "", "____" or "(mm/dd/yyyy)\""""
+    return _PLACEHOLDER.fullmatch(_BRACKETED.sub("", text)) is not None
+
+
+class ExtractedField:
+    """The value chosen for one field: typed value, text for the report, confidence and where it was found
+
+    source is the (report, page) position of the first mention of the value,
+    and reports the number of reports that gave it.
+    """
+
+    __slots__ = ("name", "type", "value", "text", "confidence", "reports", "source")
+
+    def __init__(self, name, type, value, text, confidence, reports, source):
+        self.name = name
+        self.type = type
+        self.value = value
+        self.text = text
+        self.confidence = confidence
+        self.reports = reports
+        self.source = source
+
+    def to_dict(self):
+        value = self.value.isoformat() if isinstance(self.value, date) else self.value
+        return {
+            "name": self.name,
+            "type": self.type,
+            "value": list(value) if isinstance(value, tuple) else value,
+            "text": self.text,
+            "confidence": self.confidence,
+            "reports": self.reports,
+            "source": list(self.source),
+        }
+
+
+class FieldExtractor:
+    """Field rules compiled into one label regex plus a regex per value shape"""
+
+    def __init__(self, rules=FIELD_RULES, min_confidence=DEFAULT_MIN_CONFIDENCE):
+        self.rules = tuple(rules)
+        self.min_confidence = min_confidence
+        self._groups = [f"f{n}" for n in range(len(self.rules))]
+        labels = "|".join(f"(?P<f{n}>{rule['label']})" for n, rule in enumerate(self.rules))
+        # In report text: a label anywhere, then its separator, if any, up to the value
+        self._labels = re.compile(
+            rf"(?<![\w#])(?:{labels})(?!\w)(?P<sep>[ \t]*(?:[:=]|\t|\||#|[ ]-[ ]|[ ]{{2,}})[ \t]*)?",
+            re.IGNORECASE
+        )
+        # In a template line: a label at the start, then what stands for the value
+        self._slot = re.compile(
+            rf"^(?P<label>(?:{labels}))(?!\w)[ \t]*(?P<sep>[:=#]|-(?=\s))?[ \t]*(?P<rest>.*)$",
+            re.IGNORECASE | re.DOTALL
+        )
+        self._shapes = [(n, re.compile(rule["shape"])) for n, rule in enumerate(self.rules) if rule.get("shape")]
+
+    def _rule_of(self, m):
+        groups = m.groupdict()
+        return next(n for n, name in enumerate(self._groups) if groups[name] is not None)
+
+    def _parse(self, n, text, next_line=""):
+        rule_type = self.rules[n]["type"]
+        if rule_type == ADDRESS:
+            return _parse_address(text, next_line)
+        return _PARSERS[rule_type](text.strip())
+
+    def _page_mentions(self, text):
+        """(rule, value, text, confidence) for every field value found on one page"""
+        mentions = []
+        matches = list(self._labels.finditer(text))
+        i = 0
+        while i < len(matches):
+            # Labels on the same line form one group
+            line_start = text.rfind("\n", 0, matches[i].start()) + 1
+            line_end = text.find("\n", matches[i].start())
+            line_end = len(text) if line_end < 0 else line_end
+            j = i
+            while j < len(matches) and matches[j].start() < line_end:
+                j += 1
+            group = matches[i:j]
+            i = j
+            segments = [
+                text[m.end():group[k + 1].start() if k + 1 < len(group) else line_end].strip(" \t|")
+                for k, m in enumerate(group)
+            ]
+            next_line, next_end = _line_after(text, line_end)
+
+            if not any(segments):
+                before = text[line_start:group[0].start()].strip(" \t|")
+                if len(group) > 1 and not before:
+                    # A header row of labels; values in the same columns on the next line
+                    cells = [cell for cell in _COLUMNS.split(next_line.strip()) if cell]
+                    if len(cells) == len(group):
+                        for m, cell in zip(group, cells):
+                            n = self._rule_of(m)
+                            parsed = self._parse(n, cell)
+                            if parsed:
+                                mentions.append((n, parsed[0], parsed[1], TABLE * parsed[2]))
+                        continue
+                if len(group) == 1 and not before:
+                    # A label alone on its line; the value is the next line
+                    n = self._rule_of(group[0])
+                    parsed = self._parse(n, next_line, _line_after(text, next_end)[0])
+                    if parsed:
+                        mentions.append((n, parsed[0], parsed[1], NEXT_LINE * parsed[2]))
+                continue
+
+            for k, (m, segment) in enumerate(zip(group, segments)):
+                if not segment:
+                    continue
+                n = self._rule_of(m)
+                sep = m.group("sep")
+                if sep and sep.strip(" \t") in ("", "|"):
+                    confidence = TABLE
+                elif sep or m.group().rstrip().endswith("#"):
+                    confidence = LABELED
+                elif self.rules[n]["type"] in (NAME, ADDRESS):
+                    # Too common in prose without a separator
+                    continue
+                else:
+                    confidence = UNSEPARATED
+                parsed = self._parse(n, segment, next_line if k == len(group) - 1 else "")
+                if parsed:
+                    mentions.append((n, parsed[0], parsed[1], confidence * parsed[2]))
+
+        for n, shape in self._shapes:
+            for m in shape.finditer(text):
+                parsed = self._parse(n, m.group("value"))
+                if parsed:
+                    mentions.append((n, parsed[0], parsed[1], SHAPE * parsed[2]))
+        return mentions
+
+    def extract(self, report_pages):
+        """Dict of field name -> ExtractedField from each report's page texts
+
+        A value's confidence is its best mention's, plus AGREEMENT for each
+        further report that gives it, scaled by its share of the weight of
+        all values found for the field. A date of loss equal to the
+        inspection date is halved, since reports often print only the latter.
+        """
+        # Per rule and value key: best confidence per report, and the first mention
+        candidates = {}
+        for r, pages in enumerate(report_pages):
+            for p, page in enumerate(pages):
+                for n, value, text, confidence in self._page_mentions(page):
+                    entry = candidates.setdefault(n, {}).setdefault(_key(value), {"best": {}, "first": None})
+                    entry["best"][r] = max(entry["best"].get(r, 0.0), confidence)
+                    if entry["first"] is None:
+                        entry["first"] = (value, text, (r, p))
+
+        fields = {}
+        for n, values in candidates.items():
+            weights = {key: sum(entry["best"].values()) for key, entry in values.items()}
+            key = max(weights, key=weights.get)
+            entry = values[key]
+            confidence = min(MAX_CONFIDENCE, max(entry["best"].values()) + AGREEMENT * (len(entry["best"]) - 1))
+            confidence *= weights[key] / sum(weights.values())
+            rule = self.rules[n]
+            value, text, source = entry["first"]
+            fields[rule["name"]] = ExtractedField(rule["name"], rule["type"], value, text, round(confidence, 3),
+                                                  len(entry["best"]), source)
+
+        loss, inspection = fields.get("date_of_loss"), fields.get("inspection_date")
+        if loss and inspection and loss.value == inspection.value:
+            loss.confidence = round(loss.confidence / 2, 3)
+        return fields
+
+    def template_slots(self, template, anchors):
+        """Template lines and cells that ask for a field, as {"field", "anchor", "prefix"} dicts
+
+        anchors are the template's {"id", "type", "text"} dicts, in the order
+        of template_anchors. A line such as "Date of Loss: (mm/dd/yyyy)" is
+        filled as "Date of Loss: March 4, 2024", and a "Date of Loss:" line
+        followed by a placeholder line such as "(Enter date of loss)" fills
+        that line; a label cell such as "Policy #" fills the blank cell to
+        its right, or below it when the right one is another label.
+        """
+        lines = list(template.paragraphs) + list(template.cells)
+        indexed = {(cell.table, cell.row, cell.col): cell for cell in template.cells}
+        blank = {anchor["id"] for anchor in anchors[len(lines):]}
+        slots = []
+        for k, (anchor, line) in enumerate(zip(anchors, lines)):
+            m = self._slot.match(anchor["text"])
+            if not m or not is_placeholder(m.group("rest")):
+                continue
+            if anchor["type"] == "HEADER" and not m.group("sep"):
+                # A heading such as "Dwelling Roof", not a label; "Roof Pitch:" still counts
+                continue
+            name = self.rules[self._rule_of(m)]["name"]
+            prefix = f"{m.group('label')}{m.group('sep') or ':'} "
+            if m.group("rest").strip():
+                slots.append({"field": name, "anchor": anchor["id"], "prefix": prefix})
+            elif isinstance(line, TemplateCell):
+                for position in ((line.table, line.row, line.col + 1), (line.table, line.row + 1, line.col)):
+                    neighbour = indexed.get(position)
+                    if neighbour is not None:
+                        if is_placeholder(neighbour.text) and not self._slot.match(neighbour.text.strip()):
+                            slots.append({"field": name, "anchor": neighbour.anchor, "prefix": ""})
+                            break
+                    elif TemplateCell(*position, "").anchor in blank:
+                        slots.append({"field": name, "anchor": TemplateCell(*position, "").anchor, "prefix": ""})
+                        break
+            elif m.group("sep"):
+                following = lines[k + 1] if k + 1 < len(template.paragraphs) else None
+                if following is not None and is_placeholder(anchors[k + 1]["text"]):
+                    slots.append({"field": name, "anchor": anchors[k + 1]["id"], "prefix": ""})
+                else:
+                    slots.append({"field": name, "anchor": anchor["id"], "prefix": prefix})
+        return slots
+
+    def prefill(self, slots, fields):
+        """Anchor ID -> text for the slots whose field reached min_confidence"""
+        values = {}
+        for slot in slots:
+            field = fields.get(slot["field"])
+            if field is not None and field.confidence >= self.min_confidence:
+                values[slot["anchor"]] = slot["prefix"] + field.text
+        return values
+
+
+def _line_after(text, end):
+    """The line that starts after the line break at end, and where it ends"""
+    if end >= len(text):
+        return "", len(text)
+    next_end = text.find("\n", end + 1)
+    next_end = len(text) if next_end < 0 else next_end
+    return text[end + 1:next_end], next_end
+
+
+_extractor = None
+_extractor_lock = threading.Lock()
+
+
+def get_extractor():
+    """Process-wide extractor, compiled once, with GLR_FIELD_MIN_CONFIDENCE applied"""
+    global _extractor
+    with _extractor_lock:
+        if _extractor is None:
+            min_confidence = float(os.getenv("GLR_FIELD_MIN_CONFIDENCE", DEFAULT_MIN_CONFIDENCE))
+            _extractor = FieldExtractor(FIELD_RULES, min_confidence)
+        return _extractor
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show the structured fields the rules find in PDF reports")
+    parser.add_argument("reports", nargs="+", help="PDF photo reports of one claim")
+    parser.add_argument("--json", action="store_true", help="Print the fields as JSON")
+    args = parser.parse_args(argv)
+
+    from ingest import iter_pdf_pages
+
+    extractor = get_extractor()
+    fields = extractor.extract([list(iter_pdf_pages(path)) for path in args.reports])
+    if args.json:
+        print(json.dumps({name: field.to_dict() for name, field in fields.items()}, indent=2))
+        return 0
+    for field in fields.values():
+        mark = "*" if field.confidence >= extractor.min_confidence else " "
+        print(f"{mark} {field.name:16} {field.confidence:.2f}  {field.text}  "
+              f"(report {field.source[0] + 1}, page {field.source[1] + 1})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,303 @@
+"""Headless batch processing of many GLR claims
+
+    python glr_batch.py CLAIMS --output-dir out --workers 4
+
+CLAIMS is either a directory with one sub-directory per claim (each holding
+a .docx template and one or more .pdf photo reports) or a JSON / JSONL
+manifest of {"id", "template", "reports"} entries with paths relative to the
+manifest. Completed claims are journaled to <output-dir>/batch_state.jsonl,
+so re-running the same command after a crash skips finished claims and
+retries only the rest. A finished claim whose template or reports changed
+since is run again; with --fill-mode sections only the sections whose
+reports changed are regenerated, using <output-dir>/<id>.claim.json. A JSON
+summary of per-claim timings and failures is written at the end.
+
+With --zip PATH (or --zip - for stdout) the reports are streamed into one
+ZIP archive as claims finish instead of being written one file each.
+
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# Before the pipeline modules, which read GLR_* settings when imported
+load_dotenv()
+
+from claim_state import ClaimState
+from docx_io import DocxZipWriter, save_document
+from llm_scheduler import LANE_BATCH
+from metrics import RunMetrics
+from pipeline import FILL_ANCHORED, FILL_SECTIONS, FILL_SINGLE, run_claim
+
+STATE_FILE = "batch_state.jsonl"
+CLAIM_STATE_SUFFIX = ".claim.json"
+FILL_MODE_NAMES = {"single": FILL_SINGLE, "sections": FILL_SECTIONS, "anchored": FILL_ANCHORED}
+
+
+def discover_claims(source, template=None):
+    """List claims as {"id", "template", "reports"} dicts from a directory or manifest"""
+    source = Path(source)
+    if source.is_dir():
+        return _claims_from_directory(source, template)
+    return _claims_from_manifest(source, template)
+
+
+def _claims_from_directory(root, template):
+    claim_dirs = sorted(path for path in root.iterdir() if path.is_dir())
+    if not claim_dirs:
+        claim_dirs = [root]
+    claims = []
+    for claim_dir in claim_dirs:
+        templates = sorted(claim_dir.glob("*.docx"))
+        reports = sorted(claim_dir.glob("*.pdf"))
+        if not reports:
+            continue
+        claims.append({
+            "id": claim_dir.name,
+            "template": str(templates[0]) if templates else template,
+            "reports": [str(path) for path in reports],
+        })
+    return claims
+
+
+def _claims_from_manifest(manifest, template):
+    text = manifest.read_text(encoding="utf-8")
+    if manifest.suffix == ".jsonl":
+        entries = [json.loads(line) for line in text.splitlines() if line.strip()]
+    else:
+        entries = json.loads(text)
+        if isinstance(entries, dict):
+            entries = entries.get("claims", [])
+
+    base = manifest.parent
+    claims = []
+    for n, entry in enumerate(entries):
+        claim_template = entry.get("template") or template
+        claims.append({
+            "id": str(entry.get("id") or f"claim-{n + 1}"),
+            "template": str(base / claim_template) if claim_template else None,
+            "reports": [str(base / path) for path in entry.get("reports", [])],
+        })
+    return claims
+
+
+def claim_inputs(claim):
+    """Size and modification time of a claim's files, to notice inputs changed since a finished run"""
+    inputs = []
+    for path in [claim["template"]] + claim["reports"]:
+        if path and os.path.exists(path):
+            stat = os.stat(path)
+            inputs.append([os.path.basename(path), stat.st_size, stat.st_mtime_ns])
+    return inputs
+
+
+def load_state(output_dir):
+    """Latest journal record per claim id"""
+    state = {}
+    path = Path(output_dir) / STATE_FILE
+    if not path.exists():
+        return state
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A crash can leave a torn last line; ignore it
+                continue
+            state[record["claim_id"]] = record
+    return state
+
+
+class StateJournal:
+    """Append-only, fsynced record of finished claims"""
+
+    def __init__(self, output_dir):
+        self.path = Path(output_dir) / STATE_FILE
+        self._lock = threading.Lock()
+
+    def append(self, record):
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def process_claim(claim, output_dir, api_key, fill_mode=FILL_SINGLE, pdf_workers=1, archive=None, tenant="batch"):
+    """Run the pipeline for one claim and write <output_dir>/<id>.docx, or <id>.docx in archive (a DocxZipWriter)"""
+    started = time.time()
+    errors = []
+    metrics = RunMetrics(run_id=claim["id"])
+    record = {"claim_id": claim["id"], "status": "failed", "output": None, "errors": errors,
+              "inputs": claim_inputs(claim)}
+    state_path = str(Path(output_dir) / f"{claim['id']}{CLAIM_STATE_SUFFIX}")
+    claim_state = ClaimState.load(state_path)
+    try:
+        if not claim["template"]:
+            raise ValueError("No template found for claim")
+        filled_doc, llm_response = run_claim(
+            claim["template"],
+            [(os.path.basename(path), path) for path in claim["reports"]],
+            api_key,
+            fill_mode=fill_mode,
+            pdf_workers=pdf_workers,
+            on_error=errors.append,
+            metrics=metrics,
+            claim_state=claim_state,
+            tenant=tenant,
+            lane=LANE_BATCH
+        )
+        claim_state.save(state_path)
+        if llm_response and archive is not None:
+            with metrics.stage("docx_save") as stage:
+                stage["bytes_written"] = archive.add_document(f"{claim['id']}.docx", filled_doc)
+            record["status"] = "ok"
+            record["output"] = f"{claim['id']}.docx"
+            record["archive"] = archive.label
+        elif llm_response:
+            output_path = Path(output_dir) / f"{claim['id']}.docx"
+            # Written then renamed, so a crash never leaves a truncated output behind
+            with metrics.stage("docx_save") as stage:
+                stage["bytes_written"] = save_document(filled_doc, str(output_path))
+            record["status"] = "ok"
+            record["output"] = str(output_path)
+        else:
+            errors.append("Failed to generate report")
+    except Exception as e:
+        errors.append(f"Error: {str(e)}")
+
+    record["seconds"] = round(time.time() - started, 3)
+    record["stages"] = metrics.finish(record["status"])["stages"]
+    record["finished_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    return record
+
+
+def run_batch(claims, output_dir, api_key, workers=4, fill_mode=FILL_SINGLE, pdf_workers=None, progress=None,
+              archive=None, tenant="batch"):
+    """Process claims with bounded concurrency, skipping ones already completed
+
+    With archive (a DocxZipWriter) reports are added to it as claims
+    finish, and reports of skipped claims are copied in, so the archive
+    holds every completed claim. Claims whose report only went to an
+    earlier archive are run again. Returns a summary dict with one record
+    per claim. LLM calls go through this process's scheduler in the batch
+    lane as tenant; an app process has its own scheduler and quota.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if pdf_workers is None:
+        pdf_workers = max(1, (os.cpu_count() or 1) // max(workers, 1))
+
+    state = load_state(output_dir)
+    journal = StateJournal(output_dir)
+    records = {}
+    pending = []
+    for claim in claims:
+        previous = state.get(claim["id"])
+        if (previous and previous["status"] == "ok" and previous.get("output") and not previous.get("archive")
+                and os.path.exists(previous["output"])
+                and previous.get("inputs", claim_inputs(claim)) == claim_inputs(claim)):
+            records[claim["id"]] = dict(previous, status="skipped")
+            if archive is not None:
+                with open(previous["output"], "rb") as f:
+                    archive.add(f"{claim['id']}.docx", f.read())
+        else:
+            pending.append(claim)
+
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {
+            pool.submit(process_claim, claim, output_dir, api_key, fill_mode, pdf_workers, archive, tenant): claim
+            for claim in pending
+        }
+        for future in as_completed(futures):
+            record = future.result()
+            journal.append(record)
+            records[record["claim_id"]] = record
+            if progress:
+                progress(record)
+
+    ordered = [records[claim["id"]] for claim in claims]
+    seconds = [r["seconds"] for r in ordered if r["status"] != "skipped"]
+    return {
+        "total": len(ordered),
+        "succeeded": sum(1 for r in ordered if r["status"] == "ok"),
+        "skipped": sum(1 for r in ordered if r["status"] == "skipped"),
+        "failed": sum(1 for r in ordered if r["status"] == "failed"),
+        "wall_seconds": round(time.time() - started, 3),
+        "claim_seconds_total": round(sum(seconds), 3),
+        "claims": ordered,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fill GLR templates for many claims without the Streamlit UI")
+    parser.add_argument("claims", help="Claims directory or JSON/JSONL manifest")
+    parser.add_argument("--output-dir", default="glr_output", help="Where completed .docx files are written")
+    parser.add_argument("--template", help="Template used for claims that do not include their own .docx")
+    parser.add_argument("--workers", type=int, default=4, help="Claims processed concurrently")
+    parser.add_argument("--pdf-workers", type=int, help="PDF extraction processes per claim")
+    parser.add_argument("--fill-mode", choices=sorted(FILL_MODE_NAMES), default="single")
+    parser.add_argument("--summary", help="Summary JSON path (default: <output-dir>/summary.json)")
+    parser.add_argument("--zip", help="Stream all reports into this ZIP archive instead (- for stdout)")
+    args = parser.parse_args(argv)
+
+    api_key = os.getenv("GROQ_API_KEY", "")
+    if not api_key:
+        parser.error("GROQ_API_KEY is not set")
+
+    claims = discover_claims(args.claims, args.template)
+    if not claims:
+        parser.error(f"No claims found in {args.claims}")
+
+    def report(record):
+        print(f"[{record['status']}] {record['claim_id']} in {record['seconds']:.1f}s", file=sys.stderr)
+        for error in record["errors"]:
+            print(f"    {error}", file=sys.stderr)
+
+    def batch(archive=None):
+        return run_batch(
+            claims,
+            args.output_dir,
+            api_key,
+            workers=args.workers,
+            fill_mode=FILL_MODE_NAMES[args.fill_mode],
+            pdf_workers=args.pdf_workers,
+            progress=report,
+            archive=archive
+        )
+
+    if args.zip == "-":
+        with DocxZipWriter(sys.stdout.buffer, label="-") as archive:
+            summary = batch(archive)
+    elif args.zip:
+        # Built under a .partial name so an interrupted run never leaves a truncated archive
+        partial = f"{args.zip}.partial"
+        try:
+            with DocxZipWriter(partial, label=os.path.abspath(args.zip)) as archive:
+                summary = batch(archive)
+            os.replace(partial, args.zip)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+    else:
+        summary = batch()
+    summary_path = args.summary or os.path.join(args.output_dir, "summary.json")
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    print(
+        f"{summary['succeeded']} succeeded, {summary['skipped']} skipped, {summary['failed']} failed "
+        f"in {summary['wall_seconds']:.1f}s; summary written to {summary_path}",
+        file=sys.stderr if args.zip == "-" else sys.stdout
+    )
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
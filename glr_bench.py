@@ -0,0 +1,320 @@
+"""Benchmarks for the GLR pipeline on synthetic templates and photo reports
+
+    python glr_bench.py --output bench.json --pdf-pages 10,100,1000 --latency 0.5
+
+Generates .docx templates of several sizes and text PDFs of the requested
+page counts, then times the template functions, PDF extraction and full
+claims run against the local stub LLM server. p50/p95 latency, throughput
+and peak memory per benchmark are written as JSON; pass --compare with an
+earlier results file to print the p50 change for every benchmark.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from docx import Document
+
+from doc_cache import DocumentCache
+from stub_llm_server import start_stub_server
+from template_model import ParsedTemplate
+from template_registry import get_template_registry
+
+# (sections, tables) per template size; each section is four paragraphs
+TEMPLATE_SIZES = {"small": (8, 1), "medium": (40, 4), "large": (160, 16)}
+
+SECTION_NAMES = ["Front Elevation", "Right Elevation", "Rear Elevation", "Left Elevation", "Roof", "Interior",
+                 "Contents", "Dwelling"]
+DAMAGE = ["hail hits", "missing shingles", "creased shingles", "dented gutters", "torn screens", "water stains"]
+
+
+def make_template(path, sections, tables, rows=6, cols=4):
+    """Write a synthetic GLR template with headers, labels, instructions and tables"""
+    doc = Document()
+    doc.add_paragraph("GENERAL LOSS REPORT")
+    doc.add_paragraph("Date of Loss:")
+    doc.add_paragraph("(Enter the date of loss from the reports)")
+    table_every = max(1, sections // tables) if tables else 0
+    added = 0
+    for s in range(sections):
+        doc.add_paragraph(f"{SECTION_NAMES[s % len(SECTION_NAMES)]} {s // len(SECTION_NAMES) + 1}")
+        doc.add_paragraph("Damage observed:")
+        doc.add_paragraph("(Be sure to describe count of shingles, measurements and locations)")
+        doc.add_paragraph("Describe the damage for this section here.")
+        if table_every and added < tables and s % table_every == table_every - 1:
+            table = doc.add_table(rows=rows, cols=cols)
+            for c, title in enumerate(["Item", "Quantity", "Condition", "Notes"][:cols]):
+                table.cell(0, c).text = title
+            for r in range(1, rows):
+                for c in range(cols):
+                    table.cell(r, c).text = f"(Enter value {r}.{c})"
+            added += 1
+    doc.save(path)
+
+
+def make_report_pdf(path, pages, seed=0, lines_per_page=30):
+    """Write a text PDF of photo report pages, streaming objects straight to disk"""
+    rng = random.Random(seed)
+    offsets = {}
+    with open(path, "wb") as f:
+        def write_object(number, body, stream=None):
+            offsets[number] = f.tell()
+            f.write(f"{number} 0 obj\n".encode() + body)
+            if stream is not None:
+                f.write(b"\nstream\n" + stream + b"\nendstream")
+            f.write(b"\nendobj\n")
+
+        f.write(b"%PDF-1.4\n")
+        kids = " ".join(f"{4 + 2 * n} 0 R" for n in range(pages))
+        write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode())
+        write_object(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+        for n in range(pages):
+            lines = [
+                f"Photo {n * lines_per_page + i + 1}: {rng.choice(SECTION_NAMES)} shows {rng.randint(1, 40)} "
+                f"{rng.choice(DAMAGE)} measured at {rng.randint(1, 30)} inches"
+                for i in range(lines_per_page)
+            ]
+            content = "BT /F1 9 Tf 40 760 Td 11 TL " + " ".join(f"({line}) Tj T*" for line in lines) + " ET"
+            write_object(
+                4 + 2 * n,
+                f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> "
+                f"/Contents {5 + 2 * n} 0 R >>".encode()
+            )
+            write_object(5 + 2 * n, f"<< /Length {len(content)} >>".encode(), content.encode())
+        xref = f.tell()
+        count = 3 + 2 * pages
+        f.write(f"xref\n0 {count + 1}\n0000000000 65535 f \n".encode())
+        for number in range(1, count + 1):
+            f.write(f"{offsets[number]:010d} 00000 n \n".encode())
+        f.write(f"trailer\n<< /Size {count + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered))) - 1))]
+
+
+def measure(name, case, fn, repeat, units, unit_name):
+    """Time fn repeat times, then once more under tracemalloc for its peak allocation"""
+    seconds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        seconds.append(time.perf_counter() - started)
+
+    # Separate pass: tracing slows allocation-heavy code and would skew the timings
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    p50 = percentile(seconds, 50)
+    result = {
+        "name": name,
+        "case": case,
+        "runs": repeat,
+        "p50_seconds": round(p50, 6),
+        "p95_seconds": round(percentile(seconds, 95), 6),
+        "mean_seconds": round(sum(seconds) / len(seconds), 6),
+        "throughput": round(units / p50, 3) if p50 else None,
+        "throughput_unit": f"{unit_name}/s",
+        "peak_python_mb": round(peak / 1024 / 1024, 3),
+    }
+    print(
+        f"{name:<28} {case:<16} p50 {p50 * 1000:9.1f} ms  p95 {result['p95_seconds'] * 1000:9.1f} ms  "
+        f"{result['throughput']} {result['throughput_unit']}  peak {result['peak_python_mb']} MB",
+        file=sys.stderr
+    )
+    return result
+
+
+def bench_templates(work_dir, sizes, repeat):
+    """Time the template functions on each template size"""
+    # Imported here so GLR_LLM_URL already points at the stub when llm_client loads
+    from pipeline import analyze_template_structure, extract_template_content, populate_template_smart
+
+    results = []
+    for size in sizes:
+        sections, tables = TEMPLATE_SIZES[size]
+        path = os.path.join(work_dir, f"template_{size}.docx")
+        make_template(path, sections, tables)
+        template = ParsedTemplate.load(path)
+        units = len(template.paragraphs) + len(template.cells)
+        filled = "\n".join(f"Completed line {n + 1} for the {size} template" for n in range(len(template.paragraphs)))
+        case = f"{size} ({units} items)"
+        results.append(measure("extract_template_content", case, lambda: extract_template_content(path),
+                               repeat, units, "items"))
+        results.append(measure("analyze_template_structure", case, lambda: analyze_template_structure(path),
+                               repeat, units, "items"))
+        results.append(measure("populate_template_smart", case, lambda: populate_template_smart(path, filled),
+                               repeat, units, "items"))
+    return results
+
+
+def bench_pdfs(work_dir, page_counts, repeat):
+    """Time single-process text extraction on each report size"""
+    from pipeline import extract_text_from_pdf
+
+    results = []
+    for pages in page_counts:
+        path = os.path.join(work_dir, f"report_{pages}.pdf")
+        make_report_pdf(path, pages, seed=pages)
+        results.append(measure("extract_text_from_pdf", f"{pages} pages", lambda: extract_text_from_pdf(path),
+                               repeat, pages, "pages"))
+    return results
+
+
+def bench_end_to_end(work_dir, page_counts, repeat, fill_mode, pdf_workers):
+    """Time full claims against the stub server with cold caches on every run"""
+    from pipeline import run_claim
+
+    template_path = os.path.join(work_dir, "template_medium.docx")
+    if not os.path.exists(template_path):
+        make_template(template_path, *TEMPLATE_SIZES["medium"])
+
+    results = []
+    for pages in page_counts:
+        report_path = os.path.join(work_dir, f"report_{pages}.pdf")
+        if not os.path.exists(report_path):
+            make_report_pdf(report_path, pages, seed=pages)
+        runs = []
+
+        def claim():
+            cache_path = os.path.join(work_dir, f"cache_{len(runs)}.sqlite3")
+            runs.append(cache_path)
+            get_template_registry().clear()
+            filled_doc, _ = run_claim(
+                template_path,
+                [(os.path.basename(report_path), report_path)],
+                "bench",
+                fill_mode=fill_mode,
+                pdf_workers=pdf_workers,
+                cache=DocumentCache(cache_path)
+            )
+            if filled_doc is None:
+                raise RuntimeError("Claim produced no report")
+
+        results.append(measure("run_claim", f"{pages} pages", claim, repeat, 1, "claims"))
+        for path in runs:
+            os.remove(path)
+    return results
+
+
+def compare(results, previous_path):
+    """Print the p50 change of each benchmark against an earlier results file"""
+    with open(previous_path, encoding="utf-8") as f:
+        previous = {(r["name"], r["case"]): r for r in json.load(f)["results"]}
+    print(f"\nChange in p50 versus {previous_path}:")
+    for result in results:
+        before = previous.get((result["name"], result["case"]))
+        if not before or not before["p50_seconds"]:
+            continue
+        change = (result["p50_seconds"] - before["p50_seconds"]) / before["p50_seconds"] * 100
+        print(f"  {result['name']:<28} {result['case']:<16} {before['p50_seconds'] * 1000:9.1f} ms -> "
+              f"{result['p50_seconds'] * 1000:9.1f} ms  ({change:+.1f}%)")
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _peak_rss_mb(who):
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(resource.getrusage(who).ru_maxrss / scale, 1)
+
+
+def _int_list(value):
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the GLR pipeline on synthetic documents")
+    parser.add_argument("--output", default="bench.json", help="Results JSON path")
+    parser.add_argument("--pdf-pages", type=_int_list, default=[10, 100, 1000], help="Comma-separated report sizes")
+    parser.add_argument("--templates", default=",".join(TEMPLATE_SIZES), help="Comma-separated template sizes")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per benchmark")
+    parser.add_argument("--e2e-repeat", type=int, default=3, help="Timed runs per end-to-end benchmark")
+    parser.add_argument("--skip-e2e", action="store_true", help="Only time the individual functions")
+    parser.add_argument("--latency", type=float, default=0.5, help="Stub LLM seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Stub LLM seconds per generated word")
+    parser.add_argument("--fill-mode", choices=["single", "sections", "anchored"], default="single")
+    parser.add_argument("--pdf-workers", type=int, default=1, help="PDF extraction processes in end-to-end runs")
+    parser.add_argument("--work-dir", help="Keep generated documents here instead of a temporary directory")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    args = parser.parse_args(argv)
+
+    sizes = [size.strip() for size in args.templates.split(",") if size.strip()]
+    unknown = [size for size in sizes if size not in TEMPLATE_SIZES]
+    if unknown:
+        parser.error(f"Unknown template size(s): {', '.join(unknown)}")
+
+    # Every LLM call goes to the stub and is never answered from the response cache
+    server, url = start_stub_server(latency=args.latency, token_delay=args.token_delay)
+    os.environ["GLR_LLM_URL"] = url
+    os.environ["GLR_LLM_CACHE_TTL"] = "0"
+    os.environ.setdefault("GLR_OCR", "off")
+    if not os.getenv("GLR_METRICS_LOG"):
+        # Keep per-stage JSON logs out of the benchmark output
+        logging.getLogger("glr.metrics").addHandler(logging.NullHandler())
+
+    from pipeline import FILL_ANCHORED, FILL_SECTIONS, FILL_SINGLE
+    fill_mode = {"single": FILL_SINGLE, "sections": FILL_SECTIONS, "anchored": FILL_ANCHORED}[args.fill_mode]
+
+    started = time.time()
+    with tempfile.TemporaryDirectory(prefix="glr-bench-") as tmp:
+        work_dir = args.work_dir or tmp
+        os.makedirs(work_dir, exist_ok=True)
+        results = bench_templates(work_dir, sizes, args.repeat)
+        results += bench_pdfs(work_dir, args.pdf_pages, args.repeat)
+        if not args.skip_e2e:
+            results += bench_end_to_end(work_dir, args.pdf_pages, args.e2e_repeat, fill_mode, args.pdf_workers)
+    server.shutdown()
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "wall_seconds": round(time.time() - started, 3),
+        "peak_rss_mb": _peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+        "children_peak_rss_mb": _peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None,
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
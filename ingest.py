@@ -0,0 +1,96 @@
+"""Memory-bounded ingestion of uploaded reports and templates
+
+Uploads are spooled to disk in fixed-size chunks, and PDFs on disk are read
+through a read-only memory map, so pages are faulted in by the OS on demand
+instead of the whole file being copied into process memory. Page text is
+produced lazily and the reader's object cache is dropped as it goes, so
+peak memory stays bounded however large a report is.
+"""
+import hashlib
+import mmap
+import os
+from contextlib import contextmanager
+from io import BytesIO
+
+import PyPDF2
+
+from doc_cache import content_hash
+
+CHUNK_BYTES = 1024 * 1024
+
+# Pages extracted between drops of the reader's parsed-object cache, which
+# otherwise keeps every image stream a page has touched
+RELEASE_EVERY_PAGES = 8
+
+
+def spool(source, path, chunk_size=CHUNK_BYTES):
+    """Write bytes or a binary file object to path in chunks; returns its SHA-256 hex digest"""
+    if isinstance(source, (bytes, bytearray)):
+        with open(path, "wb") as out:
+            out.write(source)
+        return content_hash(source)
+
+    digest = hashlib.sha256()
+    if hasattr(source, "seek"):
+        source.seek(0)
+    with open(path, "wb") as out:
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+            out.write(chunk)
+    return digest.hexdigest()
+
+
+def source_hash(source, chunk_size=CHUNK_BYTES):
+    """SHA-256 hex digest of PDF bytes or of a file path, read in chunks"""
+    if isinstance(source, (bytes, bytearray)):
+        return content_hash(source)
+    digest = hashlib.sha256()
+    with open(source, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_size(source):
+    """Size in bytes of PDF bytes or of a file path"""
+    if isinstance(source, (bytes, bytearray)):
+        return len(source)
+    return os.path.getsize(source)
+
+
+@contextmanager
+def open_pdf(source):
+    """PdfReader over bytes, a binary file object, or a memory-mapped file path"""
+    if isinstance(source, (bytes, bytearray)):
+        yield PyPDF2.PdfReader(BytesIO(source))
+        return
+    if hasattr(source, "read"):
+        yield PyPDF2.PdfReader(source)
+        return
+
+    with open(source, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError("PDF file is empty")
+        # PdfReader would read a path fully into a BytesIO; a map keeps it on disk
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield PyPDF2.PdfReader(data)
+
+
+def page_count(source):
+    """Number of pages in a PDF"""
+    with open_pdf(source) as reader:
+        return len(reader.pages)
+
+
+def iter_pdf_pages(source, start=0, end=None):
+    """Yield the text of pages [start, end) one at a time"""
+    with open_pdf(source) as reader:
+        if end is None:
+            end = len(reader.pages)
+        for n in range(start, end):
+            yield reader.pages[n].extract_text() or ""
+            if (n - start + 1) % RELEASE_EVERY_PAGES == 0:
+                reader.resolved_objects.clear()
@@ -0,0 +1,294 @@
+"""Background job queue so long pipeline runs never block a Streamlit script run
+
+Job state lives in SQLite and job files (template, reports, output) in a
+directory per job, so any session can poll a job and download its output
+until it expires. Jobs run on an in-process thread pool.
+"""
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from claim_state import ClaimState
+from doc_cache import DEFAULT_CACHE_DIR
+from docx_io import document_bytes, write_atomic
+from ingest import spool
+from llm_scheduler import LANE_INTERACTIVE
+from metrics import RunMetrics
+from pipeline import FILL_SINGLE, run_claim
+
+DEFAULT_WORKERS = 2
+DEFAULT_TTL_SECONDS = 60 * 60
+CLAIM_STATE_FILE = "claim_state.json"
+# Finished reports kept in memory for download, newest first, up to this many bytes
+OUTPUT_MEMORY_BYTES = 64 * 1024 * 1024
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobQueue:
+    """SQLite-backed job queue drained by a pool of worker threads"""
+
+    def __init__(self, root=None, workers=None, ttl=None):
+        if root is None:
+            root = os.getenv("GLR_JOBS_DIR", os.path.join(os.getenv("GLR_CACHE_DIR", DEFAULT_CACHE_DIR), "jobs"))
+        if workers is None:
+            workers = int(os.getenv("GLR_JOB_WORKERS", DEFAULT_WORKERS))
+        if ttl is None:
+            ttl = float(os.getenv("GLR_JOB_TTL", DEFAULT_TTL_SECONDS))
+        os.makedirs(root, exist_ok=True)
+        self.root = root
+        self.ttl = ttl
+        self.path = os.path.join(root, "jobs.sqlite3")
+        self._lock = threading.Lock()
+        self._outputs = OrderedDict()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="glr-job")
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    progress INTEGER NOT NULL DEFAULT 0,
+                    message TEXT NOT NULL DEFAULT '',
+                    preview TEXT NOT NULL DEFAULT '',
+                    errors TEXT NOT NULL DEFAULT '[]',
+                    metrics TEXT NOT NULL DEFAULT '{}',
+                    params TEXT NOT NULL,
+                    output_name TEXT,
+                    created REAL NOT NULL,
+                    updated REAL NOT NULL,
+                    expires REAL
+                )
+            """)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "metrics" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN metrics TEXT NOT NULL DEFAULT '{}'")
+            # API keys are never persisted, so work orphaned by a restart cannot resume
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = ?, message = ?, updated = ?, expires = ? WHERE status IN (?, ?)",
+                (FAILED, "Interrupted by a server restart", now, now + ttl, QUEUED, RUNNING)
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _job_dir(self, job_id):
+        return os.path.join(self.root, job_id)
+
+    def submit(self, template, reports, api_key, fill_mode=FILL_SINGLE, stream=False, pdf_workers=None,
+               output_name="completed_glr_report.docx", previous_job=None, tenant=None, lane=LANE_INTERACTIVE):
+        """Queue a claim and return its job id
+
+        template is .docx bytes or a binary file object and reports a list
+        of (name, pdf) pairs of the same; inputs are spooled to the job
+        directory in chunks so the caller's upload buffers can be released,
+        and the worker reads reports from disk. previous_job is an earlier
+        run of the same claim; its claim state lets a section-wise re-run
+        regenerate only the sections whose reports changed. tenant (such as
+        the browser session) and lane decide the job's share of LLM capacity
+        when several are waiting.
+        """
+        if previous_job is not None and self.get(previous_job) is None:
+            previous_job = None
+        self.purge_expired()
+        job_id = uuid.uuid4().hex
+        job_dir = self._job_dir(job_id)
+        os.makedirs(os.path.join(job_dir, "reports"))
+        report_files = []
+        try:
+            spool(template, os.path.join(job_dir, "template.docx"))
+            for n, (name, data) in enumerate(reports):
+                path = os.path.join(job_dir, "reports", f"{n:04d}.pdf")
+                spool(data, path)
+                report_files.append([name, path])
+        except BaseException:
+            # Not yet in the database, so purge_expired would never find it
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+
+        params = {
+            "fill_mode": fill_mode,
+            "stream": stream,
+            "pdf_workers": pdf_workers,
+            "reports": report_files,
+            "previous_job": previous_job,
+            "tenant": tenant,
+            "lane": lane,
+        }
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, message, params, output_name, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, "Queued", json.dumps(params), output_name, now, now)
+            )
+        self._pool.submit(self._run, job_id, api_key)
+        return job_id
+
+    def _update(self, job_id, **fields):
+        fields["updated"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def _run(self, job_id, api_key):
+        with self._lock, self._connect() as conn:
+            claimed = conn.execute(
+                "UPDATE jobs SET status = ?, message = ?, updated = ? WHERE id = ? AND status = ?",
+                (RUNNING, "Starting...", time.time(), job_id, QUEUED)
+            ).rowcount
+            row = conn.execute("SELECT params FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if not claimed or row is None:
+            return
+
+        params = json.loads(row[0])
+        job_dir = self._job_dir(job_id)
+        errors = []
+        preview = []
+        metrics = RunMetrics(run_id=job_id[:12])
+        previous_job = params.get("previous_job")
+        claim_state = ClaimState.load(
+            os.path.join(self._job_dir(previous_job), CLAIM_STATE_FILE) if previous_job else None
+        )
+        last = {"progress": -1, "preview_at": 0.0}
+
+        def progress(percent, message):
+            if percent != last["progress"]:
+                last["progress"] = percent
+                self._update(job_id, progress=percent, message=message)
+
+        def on_paragraph(paragraph):
+            preview.append(paragraph)
+            # Throttle preview writes; the UI polls every couple of seconds anyway
+            if time.time() - last["preview_at"] > 1.0:
+                last["preview_at"] = time.time()
+                self._update(job_id, preview="\n".join(preview)[-2000:])
+
+        def on_error(message):
+            errors.append(message)
+            self._update(job_id, errors=json.dumps(errors))
+
+        try:
+            filled_doc, llm_response = run_claim(
+                os.path.join(job_dir, "template.docx"),
+                [(name, path) for name, path in params["reports"]],
+                api_key,
+                fill_mode=params["fill_mode"],
+                stream=params["stream"],
+                pdf_workers=params["pdf_workers"],
+                progress=progress,
+                on_paragraph=on_paragraph,
+                on_error=on_error,
+                metrics=metrics,
+                claim_state=claim_state,
+                tenant=params.get("tenant"),
+                lane=params.get("lane", LANE_INTERACTIVE)
+            )
+            claim_state.save(os.path.join(job_dir, CLAIM_STATE_FILE))
+            if not llm_response:
+                self._update(
+                    job_id, status=FAILED, message="Failed to generate report",
+                    metrics=json.dumps(metrics.finish(FAILED)), expires=time.time() + self.ttl
+                )
+                return
+            with metrics.stage("docx_save") as stage:
+                output = document_bytes(filled_doc)
+                stage["bytes_written"] = write_atomic(os.path.join(job_dir, "output.docx"), output)
+            self._remember_output(job_id, output)
+            self._update(
+                job_id, status=DONE, progress=100, message="Complete!",
+                preview=llm_response[:2000] + "..." if len(llm_response) > 2000 else llm_response,
+                metrics=json.dumps(metrics.finish(DONE)), expires=time.time() + self.ttl
+            )
+        except Exception as e:
+            errors.append(f"Error: {str(e)}")
+            self._update(
+                job_id, status=FAILED, message="Failed", errors=json.dumps(errors),
+                metrics=json.dumps(metrics.finish(FAILED)), expires=time.time() + self.ttl
+            )
+
+    def get(self, job_id):
+        """Job status as a dict, or None if unknown or expired"""
+        with self._lock, self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or (row["expires"] is not None and row["expires"] < time.time()):
+            return None
+        job = dict(row)
+        job["errors"] = json.loads(job["errors"])
+        job["metrics"] = json.loads(job["metrics"])
+        job.pop("params")
+        return job
+
+    def active(self, job_ids):
+        """How many of job_ids are still queued or running"""
+        job_ids = list(job_ids)
+        if not job_ids:
+            return 0
+        with self._lock, self._connect() as conn:
+            return conn.execute(
+                f"SELECT COUNT(*) FROM jobs WHERE status IN (?, ?) AND id IN ({', '.join('?' * len(job_ids))})",
+                (QUEUED, RUNNING, *job_ids)
+            ).fetchone()[0]
+
+    def output(self, job_id):
+        """Bytes of a finished job's .docx, or None"""
+        job = self.get(job_id)
+        if job is None or job["status"] != DONE:
+            return None
+        with self._lock:
+            output = self._outputs.get(job_id)
+        if output is not None:
+            return output
+        with open(os.path.join(self._job_dir(job_id), "output.docx"), "rb") as f:
+            return f.read()
+
+    def _remember_output(self, job_id, output):
+        """Keep a finished report in memory so polling sessions download it without a disk read"""
+        with self._lock:
+            self._outputs[job_id] = output
+            total = sum(len(data) for data in self._outputs.values())
+            while total > OUTPUT_MEMORY_BYTES and len(self._outputs) > 1:
+                total -= len(self._outputs.popitem(last=False)[1])
+
+    def counts(self):
+        """Number of live jobs per status"""
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(
+                "SELECT status, COUNT(*) FROM jobs WHERE expires IS NULL OR expires >= ? GROUP BY status",
+                (time.time(),)
+            ).fetchall()
+        return dict(rows)
+
+    def purge_expired(self):
+        """Delete expired jobs and their files"""
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            expired = [row[0] for row in conn.execute("SELECT id FROM jobs WHERE expires < ?", (now,))]
+            conn.execute("DELETE FROM jobs WHERE expires < ?", (now,))
+        for job_id in expired:
+            with self._lock:
+                self._outputs.pop(job_id, None)
+            shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
+        return len(expired)
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Process-wide job queue shared by all Streamlit sessions"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
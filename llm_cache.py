@@ -0,0 +1,147 @@
+"""Process-wide LLM response cache with request coalescing"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_MAX_MB = 64
+
+
+def response_key(model, temperature, max_tokens, prompt):
+    """Cache key for a completion request"""
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    return json.dumps([model, temperature, max_tokens, prompt_hash])
+
+
+class _Flight:
+    """A request currently being computed that other callers can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResponseCache:
+    """Thread-safe TTL + LRU cache that runs identical concurrent requests once"""
+
+    def __init__(self, ttl=None, max_bytes=None):
+        if ttl is None:
+            ttl = float(os.getenv("GLR_LLM_CACHE_TTL", DEFAULT_TTL_SECONDS))
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv("GLR_LLM_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value, size)
+        self._bytes = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return a fresh cached value or None"""
+        with self._lock:
+            return self._lookup(key)
+
+    def put(self, key, value):
+        """Store a value, evicting expired and least recently used entries; empty completions are not kept"""
+        if not value or not value.strip():
+            return
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value, size)
+            self._bytes += size
+            self._evict()
+
+    def get_or_call(self, key, fn):
+        """Return the cached value for key, calling fn() at most once across threads
+
+        Callers that arrive while fn() is running for the same key wait for
+        its result instead of sending a duplicate request. Exceptions from
+        fn() propagate to every waiting caller and nothing is cached; nor is
+        an empty or whitespace-only result, so the next call retries.
+        """
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                return value
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = fn()
+            if flight.value:
+                self.put(key, flight.value)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def _evict(self):
+        now = time.monotonic()
+        for key in [k for k, entry in self._entries.items() if entry[0] < now]:
+            self._remove(key)
+        while self._bytes > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+
+    def stats(self):
+        """Counters for the sidebar"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Process-wide response cache shared by all Streamlit sessions"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
@@ -0,0 +1,212 @@
+"""Shared, connection-pooled LLM client with retries and a concurrency limit"""
+import email.utils
+import json
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+LLM_URL = os.getenv("GLR_LLM_URL", "https://api.groq.com/openai/v1/chat/completions")
+LLM_MODEL = "llama-3.3-70b-versatile"
+LLM_TEMPERATURE = 0.2
+LLM_MAX_TOKENS = 8000
+
+RETRY_STATUSES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """Raised when a completion request fails after all retries"""
+
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+def _env_number(name, default):
+    value = os.getenv(name, "").strip()
+    try:
+        return type(default)(value) if value else default
+    except ValueError:
+        return default
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def iter_sse_content(lines):
+    """Yield content deltas from OpenAI-style server-sent event lines"""
+    for line in lines:
+        if not line or not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return
+        try:
+            choice = json.loads(data)["choices"][0]
+        except (ValueError, KeyError, IndexError):
+            continue
+        content = (choice.get("delta") or {}).get("content")
+        if content:
+            yield content
+
+
+def iter_paragraphs(deltas):
+    """Group streamed text deltas into complete, non-empty paragraphs"""
+    buffer = ""
+    for delta in deltas:
+        buffer += delta
+        while "\n" in buffer:
+            line, buffer = buffer.split("\n", 1)
+            if line.strip():
+                yield line.strip()
+    if buffer.strip():
+        yield buffer.strip()
+
+
+class LLMClient:
+    """OpenAI-compatible chat client reusing keep-alive connections
+
+    Requests retry on connection errors, timeouts, 429 and 5xx responses
+    with jittered exponential backoff, honoring Retry-After when present.
+    At most max_concurrency requests are on the wire at once per client.
+    """
+
+    def __init__(self, url=None, connect_timeout=None, read_timeout=None, max_retries=None,
+                 backoff_base=None, backoff_max=None, max_concurrency=None):
+        self.url = url or LLM_URL
+        self.connect_timeout = connect_timeout if connect_timeout is not None else _env_number("GLR_LLM_CONNECT_TIMEOUT", 10.0)
+        self.read_timeout = read_timeout if read_timeout is not None else _env_number("GLR_LLM_TIMEOUT", 180.0)
+        self.max_retries = max_retries if max_retries is not None else _env_number("GLR_LLM_MAX_RETRIES", 4)
+        self.backoff_base = backoff_base if backoff_base is not None else 1.0
+        self.backoff_max = backoff_max if backoff_max is not None else 60.0
+        self.max_concurrency = max_concurrency or _env_number("GLR_LLM_CONCURRENCY", 4)
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(self.max_concurrency, 10))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def chat(self, prompt, api_key, model=LLM_MODEL, temperature=LLM_TEMPERATURE, max_tokens=LLM_MAX_TOKENS):
+        """Return the completion text for a single user prompt"""
+        payload = {
+            "model": model,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+        body = self.post(payload, api_key)
+        try:
+            return body["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError):
+            raise LLMError(f"Unexpected response format: {str(body)[:200]}")
+
+    def stream_chat(self, prompt, api_key, model=LLM_MODEL, temperature=LLM_TEMPERATURE, max_tokens=LLM_MAX_TOKENS):
+        """Yield completion text deltas as the server streams them (SSE)"""
+        payload = {
+            "model": model,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": True
+        }
+        response = self.post(payload, api_key, stream=True)
+        try:
+            yield from iter_sse_content(response.iter_lines(decode_unicode=True))
+        finally:
+            response.close()
+            self._slots.release()
+
+    def post(self, payload, api_key, stream=False):
+        """POST a payload with retries and return parsed JSON
+
+        With stream=True the open response is returned instead and its
+        concurrency slot stays held; the caller must close the response and
+        call self._slots.release() once the body has been consumed.
+        """
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+        attempt = 0
+        while True:
+            retry_after = None
+            self._slots.acquire()
+            holding = True
+            try:
+                response = self.session.post(
+                    self.url,
+                    headers=headers,
+                    json=payload,
+                    timeout=(self.connect_timeout, self.read_timeout),
+                    stream=stream
+                )
+                if response.status_code < 400:
+                    if stream:
+                        holding = False
+                        return response
+                    return response.json()
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                error = LLMError(
+                    f"HTTP {response.status_code}: {response.text[:200]}",
+                    status=response.status_code,
+                    retry_after=retry_after
+                )
+                response.close()
+                if response.status_code not in RETRY_STATUSES:
+                    raise error
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = LLMError(f"{type(e).__name__}: {str(e)}")
+            finally:
+                if holding:
+                    self._slots.release()
+
+            if attempt >= self.max_retries:
+                raise error
+            if retry_after is not None and retry_after > self.backoff_max:
+                # The provider wants a longer pause than we are willing to block for
+                raise error
+            time.sleep(self._backoff(attempt, retry_after))
+            attempt += 1
+
+    def _backoff(self, attempt, retry_after=None):
+        """Full-jitter exponential delay, never shorter than Retry-After"""
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.backoff_base)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Process-wide client so every session shares one connection pool"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient()
+        return _client
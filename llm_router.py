@@ -0,0 +1,223 @@
+"""Routing of LLM calls across several OpenAI-compatible backends
+
+Backends come from GLR_LLM_BACKENDS, a JSON list (or the path of a JSON
+file) of entries such as
+
+    {"name": "groq", "url": "https://api.groq.com/openai/v1/chat/completions",
+     "model": "llama-3.3-70b-versatile", "structure_model": "llama-3.1-8b-instant",
+     "api_key_env": "GROQ_API_KEY"}
+    {"name": "local", "url": "http://127.0.0.1:8080/v1/chat/completions",
+     "model": "llama-3.1-8b", "api_key": "none", "tasks": ["structure"], "context_tokens": 32768}
+
+Without it, a single backend is built from GLR_LLM_URL and the default
+model, with GLR_LLM_STRUCTURE_MODEL optionally naming a cheaper model for
+the structure-analysis call. Each call goes to the healthy backend with
+the lowest error-weighted latency; on failure the next backend is tried,
+and a backend that keeps failing or is rate limited sits out a cooldown.
+"""
+import json
+import os
+import threading
+import time
+
+from llm_client import LLM_MAX_TOKENS, LLM_MODEL, LLM_TEMPERATURE, LLM_URL, LLMClient, get_client
+
+TASK_STRUCTURE = "structure"
+TASK_FILL = "fill"
+TASKS = (TASK_STRUCTURE, TASK_FILL)
+
+# Weight of the newest sample in the latency and error-rate moving averages
+EWMA_ALPHA = 0.3
+# Consecutive failures before a backend is benched, and for how long
+FAILURE_THRESHOLD = 3
+DEFAULT_COOLDOWN_SECONDS = 30.0
+# Retries inside one backend before failing over, when there is somewhere to fail over to
+FAILOVER_RETRIES = 1
+
+
+class Backend:
+    """One OpenAI-compatible endpoint with its models and health statistics"""
+
+    def __init__(self, name, url, model=LLM_MODEL, structure_model=None, api_key=None, api_key_env=None,
+                 tasks=TASKS, context_tokens=None, client=None, max_retries=None):
+        self.name = name
+        self.url = url
+        self.models = {TASK_FILL: model, TASK_STRUCTURE: structure_model or model}
+        self.api_key = api_key
+        self.api_key_env = api_key_env
+        self.tasks = tuple(tasks)
+        self.context_tokens = context_tokens
+        self.client = client or LLMClient(url=url, max_retries=max_retries)
+        self.latency = None
+        self.error_rate = 0.0
+        self.calls = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self._lock = threading.Lock()
+
+    def key_for(self, api_key):
+        """The backend's own key if configured, else the caller's"""
+        if self.api_key is not None:
+            return self.api_key
+        if self.api_key_env:
+            return os.getenv(self.api_key_env, "")
+        return api_key
+
+    def healthy(self, now=None):
+        return (now or time.time()) >= self.cooldown_until
+
+    def score(self):
+        """Expected cost of a call: latency inflated by recent errors; untried backends go first"""
+        return (self.latency or 0.0) * (1 + 4 * self.error_rate)
+
+    def record_success(self, seconds):
+        with self._lock:
+            self.calls += 1
+            self.consecutive_failures = 0
+            self.latency = seconds if self.latency is None else (1 - EWMA_ALPHA) * self.latency + EWMA_ALPHA * seconds
+            self.error_rate *= 1 - EWMA_ALPHA
+
+    def record_failure(self, error):
+        with self._lock:
+            self.calls += 1
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.error_rate = (1 - EWMA_ALPHA) * self.error_rate + EWMA_ALPHA
+            retry_after = getattr(error, "retry_after", None)
+            if getattr(error, "status", None) == 429 or self.consecutive_failures >= FAILURE_THRESHOLD:
+                self.cooldown_until = time.time() + max(retry_after or 0, DEFAULT_COOLDOWN_SECONDS)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "name": self.name,
+                "models": dict(self.models),
+                "healthy": self.healthy(),
+                "latency_seconds": round(self.latency, 3) if self.latency is not None else None,
+                "error_rate": round(self.error_rate, 3),
+                "calls": self.calls,
+                "failures": self.failures,
+            }
+
+
+class LLMRouter:
+    """Send each call to the best healthy backend for its task, failing over on errors"""
+
+    def __init__(self, backends):
+        if not backends:
+            raise ValueError("At least one LLM backend is required")
+        self.backends = backends
+
+    def candidates(self, task):
+        """Backends serving task, healthy ones first, each group fastest first"""
+        now = time.time()
+        serving = [b for b in self.backends if task in b.tasks] or self.backends
+        healthy = sorted((b for b in serving if b.healthy(now)), key=lambda b: b.score())
+        benched = sorted((b for b in serving if not b.healthy(now)), key=lambda b: b.cooldown_until)
+        return healthy + benched
+
+    def route_key(self, task):
+        """Models a task can be answered by, for cache keys"""
+        return "|".join(f"{b.name}:{b.models[task]}" for b in self.backends if task in b.tasks) or LLM_MODEL
+
+    def context_tokens(self, task):
+        """Smallest context window configured among the task's backends, or None"""
+        windows = [b.context_tokens for b in self.backends if task in b.tasks and b.context_tokens]
+        return min(windows) if windows else None
+
+    def chat(self, prompt, api_key, task=TASK_FILL, temperature=LLM_TEMPERATURE, max_tokens=LLM_MAX_TOKENS):
+        """Completion text from the first backend that answers; raises the last error if none do"""
+        error = None
+        for backend in self.candidates(task):
+            started = time.perf_counter()
+            try:
+                text = backend.client.chat(prompt, backend.key_for(api_key), backend.models[task], temperature,
+                                           max_tokens)
+            except Exception as e:
+                backend.record_failure(e)
+                error = e
+                continue
+            backend.record_success(time.perf_counter() - started)
+            return text
+        raise error
+
+    def stream_chat(self, prompt, api_key, task=TASK_FILL, temperature=LLM_TEMPERATURE, max_tokens=LLM_MAX_TOKENS):
+        """Yield completion deltas, failing over only until the first delta arrives
+
+        Once text has been handed to the caller a failure is raised, since
+        another backend would not continue the same completion.
+        """
+        error = None
+        for backend in self.candidates(task):
+            started = time.perf_counter()
+            deltas = backend.client.stream_chat(prompt, backend.key_for(api_key), backend.models[task], temperature,
+                                                max_tokens)
+            streamed = False
+            try:
+                for delta in deltas:
+                    if not streamed:
+                        # Time to first token is what a streaming caller waits on
+                        backend.record_success(time.perf_counter() - started)
+                        streamed = True
+                    yield delta
+            except Exception as e:
+                backend.record_failure(e)
+                if streamed:
+                    raise
+                error = e
+                continue
+            finally:
+                deltas.close()
+            if not streamed:
+                backend.record_success(time.perf_counter() - started)
+            return
+        raise error
+
+    def stats(self):
+        return [backend.stats() for backend in self.backends]
+
+
+def load_backends(spec=None):
+    """Backends from a GLR_LLM_BACKENDS-style JSON list or file path, or the single default backend"""
+    spec = spec if spec is not None else os.getenv("GLR_LLM_BACKENDS", "").strip()
+    if not spec:
+        return [Backend(
+            "default",
+            LLM_URL,
+            structure_model=os.getenv("GLR_LLM_STRUCTURE_MODEL") or None,
+            client=get_client()
+        )]
+
+    if not spec.lstrip().startswith("["):
+        with open(spec, encoding="utf-8") as f:
+            spec = f.read()
+    entries = json.loads(spec)
+    max_retries = FAILOVER_RETRIES if len(entries) > 1 else None
+    return [
+        Backend(
+            entry.get("name") or f"backend-{n + 1}",
+            entry.get("url") or LLM_URL,
+            model=entry.get("model") or LLM_MODEL,
+            structure_model=entry.get("structure_model"),
+            api_key=entry.get("api_key"),
+            api_key_env=entry.get("api_key_env"),
+            tasks=entry.get("tasks") or TASKS,
+            context_tokens=entry.get("context_tokens"),
+            max_retries=entry.get("max_retries", max_retries)
+        )
+        for n, entry in enumerate(entries)
+    ]
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    """Process-wide router so backend health is shared by every session"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = LLMRouter(load_backends())
+        return _router
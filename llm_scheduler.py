@@ -0,0 +1,273 @@
+"""Fair scheduling of LLM calls that share one provider quota
+
+Every session of the deployed app uses the same GROQ_API_KEY, so one user
+running many claims could take the whole rate limit. Each LLM call that
+misses the response cache waits for a slot from the process-wide
+LLMScheduler, which
+
+- admits a call only when both token buckets have room: GLR_LLM_RPM
+  requests and GLR_LLM_TPM tokens per minute (0 = unlimited). A call
+  reserves its prompt tokens plus GLR_LLM_COMPLETION_TOKENS and is charged
+  the difference once the completion is known;
+- keeps at most GLR_LLM_MAX_IN_FLIGHT calls on the wire, so waiting calls
+  are ordered here rather than by the HTTP client's semaphore;
+- serves the interactive lane (a session's claims) before the batch lane
+  (claims a session queues behind its unfinished ones, and glr_batch),
+  and within a lane orders calls by start-time fair queuing on tokens, so a
+  tenant with many queued calls cannot crowd out one with a few.
+
+Buckets and queues are per process; a glr_batch run has its own, so its
+GLR_LLM_RPM/GLR_LLM_TPM and the app's should add up to the provider's limit.
+
+stats() gives queue depth per lane, calls in flight and waiting times, shown
+in the app sidebar and exported as gauges on /metrics. To watch it against
+the stub server:
+
+    python stub_llm_server.py --port 8800 --latency 0.5 &
+    python llm_scheduler.py --url http://127.0.0.1:8800/v1/chat/completions --rpm 60 --tenants heavy:30,light:3
+"""
+import argparse
+import heapq
+import itertools
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from llm_client import LLMClient
+from llm_router import get_router
+from metrics import get_registry
+
+LANE_INTERACTIVE = "interactive"
+LANE_BATCH = "batch"
+# Highest priority first
+LANES = (LANE_INTERACTIVE, LANE_BATCH)
+
+DEFAULT_COMPLETION_TOKENS = 1024
+# Idle tenants' fair-queuing tags are dropped once this many are tracked
+MAX_TRACKED_TENANTS = 1000
+
+
+class TokenBucket:
+    """rate_per_minute units refilled continuously, holding at most one minute's worth; rate 0 means unlimited
+
+    Not thread-safe; the scheduler calls it under its own lock.
+    """
+
+    def __init__(self, rate_per_minute):
+        self.rate_per_minute = rate_per_minute
+        self.capacity = float(rate_per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate_per_minute / 60)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until amount can be taken; amounts above capacity only wait for a full bucket"""
+        if not self.rate_per_minute:
+            return 0.0
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing * 60 / self.rate_per_minute)
+
+    def take(self, amount, now):
+        if self.rate_per_minute:
+            self._refill(now)
+            self.level -= min(amount, self.capacity)
+
+    def adjust(self, amount, now):
+        """Give back (or, when negative, charge) amount after the real cost is known"""
+        if self.rate_per_minute:
+            self._refill(now)
+            self.level = min(self.capacity, self.level + amount)
+
+
+class LLMScheduler:
+    """Rate-limited, priority-laned, per-tenant fair admission of LLM calls"""
+
+    def __init__(self, requests_per_minute=0, tokens_per_minute=0, max_in_flight=4,
+                 completion_tokens=DEFAULT_COMPLETION_TOKENS):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_in_flight = max(1, max_in_flight)
+        self.completion_tokens = completion_tokens
+        self.in_flight = 0
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        # Per lane: heap of (start tag, seq, ticket), the virtual time, and each tenant's last finish tag
+        self._queues = {lane: [] for lane in LANES}
+        self._virtual = {lane: 0.0 for lane in LANES}
+        self._finish = {lane: {} for lane in LANES}
+        self._admitted = {lane: 0 for lane in LANES}
+        self._waited = {lane: 0.0 for lane in LANES}
+        self._max_wait = {lane: 0.0 for lane in LANES}
+
+    def _head(self):
+        for lane in LANES:
+            if self._queues[lane]:
+                return self._queues[lane][0][2]
+        return None
+
+    def _enqueue(self, ticket):
+        lane = ticket["lane"]
+        finish = self._finish[lane]
+        if len(finish) > MAX_TRACKED_TENANTS:
+            for tenant in [t for t, tag in finish.items() if tag <= self._virtual[lane]]:
+                del finish[tenant]
+        start = max(self._virtual[lane], finish.get(ticket["tenant"], 0.0))
+        finish[ticket["tenant"]] = start + ticket["tokens"]
+        ticket["start"] = start
+        heapq.heappush(self._queues[lane], (start, next(self._seq), ticket))
+
+    @contextmanager
+    def slot(self, tenant=None, lane=LANE_INTERACTIVE, prompt_tokens=0):
+        """Block until this call may go out; the yielded dict takes the real "completion_tokens"
+
+        tenant is whoever the call is made for (a session, or a batch run)
+        and lane one of LANES.
+        """
+        if lane not in self._queues:
+            raise ValueError(f"Unknown lane: {lane}")
+        reserved = prompt_tokens + self.completion_tokens
+        ticket = {"tenant": tenant or "", "lane": lane, "tokens": reserved}
+        enqueued = time.monotonic()
+        with self._cond:
+            self._enqueue(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    timeout = None
+                    if self._head() is ticket and self.in_flight < self.max_in_flight:
+                        timeout = max(self.requests.wait_time(1, now), self.tokens.wait_time(reserved, now))
+                        if timeout <= 0:
+                            break
+                    self._cond.wait(timeout)
+            except BaseException:
+                # Interrupted while waiting; leave the queue to the calls behind
+                self._queues[lane] = [entry for entry in self._queues[lane] if entry[2] is not ticket]
+                heapq.heapify(self._queues[lane])
+                self._cond.notify_all()
+                raise
+            heapq.heappop(self._queues[lane])
+            self._virtual[lane] = ticket["start"]
+            self.requests.take(1, now)
+            self.tokens.take(reserved, now)
+            self.in_flight += 1
+            waited = now - enqueued
+            self._admitted[lane] += 1
+            self._waited[lane] += waited
+            self._max_wait[lane] = max(self._max_wait[lane], waited)
+            # The next call in line may be able to go too
+            self._cond.notify_all()
+
+        usage = {}
+        try:
+            yield usage
+        finally:
+            with self._cond:
+                self.in_flight -= 1
+                if "completion_tokens" in usage:
+                    self.tokens.adjust(self.completion_tokens - usage["completion_tokens"], time.monotonic())
+                self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            waiting = [entry[2]["tenant"] for lane in LANES for entry in self._queues[lane]]
+            return {
+                "queued": {lane: len(self._queues[lane]) for lane in LANES},
+                "tenants_waiting": len(set(waiting)),
+                "in_flight": self.in_flight,
+                "admitted": dict(self._admitted),
+                "avg_wait_seconds": {
+                    lane: round(self._waited[lane] / self._admitted[lane], 3) if self._admitted[lane] else 0.0
+                    for lane in LANES
+                },
+                "max_wait_seconds": {lane: round(seconds, 3) for lane, seconds in self._max_wait.items()},
+                "limits": {
+                    "requests_per_minute": self.requests.rate_per_minute,
+                    "tokens_per_minute": self.tokens.rate_per_minute,
+                    "max_in_flight": self.max_in_flight,
+                },
+            }
+
+
+def _env_int(name, default):
+    value = os.getenv(name, "").strip()
+    return int(value) if value.isdigit() else default
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Process-wide scheduler shared by every session; in-flight calls default to the backends' combined concurrency"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            max_in_flight = _env_int("GLR_LLM_MAX_IN_FLIGHT", 0) or sum(
+                backend.client.max_concurrency for backend in get_router().backends
+            )
+            _scheduler = LLMScheduler(
+                requests_per_minute=_env_int("GLR_LLM_RPM", 0),
+                tokens_per_minute=_env_int("GLR_LLM_TPM", 0),
+                max_in_flight=max_in_flight,
+                completion_tokens=_env_int("GLR_LLM_COMPLETION_TOKENS", DEFAULT_COMPLETION_TOKENS)
+            )
+            scheduler = _scheduler
+            registry = get_registry()
+            registry.add_gauge("glr_llm_queue_depth", "LLM calls waiting for a scheduler slot", lambda: [
+                ({"lane": lane}, depth) for lane, depth in scheduler.stats()["queued"].items()
+            ])
+            registry.add_gauge("glr_llm_in_flight", "LLM calls admitted by the scheduler and not yet finished",
+                               lambda: [({}, scheduler.stats()["in_flight"])])
+        return _scheduler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drive concurrent tenants through the scheduler against an endpoint")
+    parser.add_argument("--url", required=True, help="OpenAI-compatible chat completions URL, e.g. the stub server")
+    parser.add_argument("--tenants", default="heavy:20,light:3",
+                        help="Comma-separated name:calls[:batch] entries; all calls are queued at once")
+    parser.add_argument("--rpm", type=int, default=0, help="Requests per minute (0 = unlimited)")
+    parser.add_argument("--tpm", type=int, default=0, help="Tokens per minute (0 = unlimited)")
+    parser.add_argument("--max-in-flight", type=int, default=4)
+    parser.add_argument("--prompt-tokens", type=int, default=200, help="Approximate size of each prompt")
+    args = parser.parse_args(argv)
+
+    scheduler = LLMScheduler(args.rpm, args.tpm, args.max_in_flight)
+    client = LLMClient(url=args.url, max_concurrency=args.max_in_flight)
+    prompt = " ".join(["word"] * args.prompt_tokens)
+    calls = []
+    for spec in args.tenants.split(","):
+        name, count, *lane = spec.split(":")
+        calls += [(name, LANE_BATCH if lane == ["batch"] else LANE_INTERACTIVE)] * int(count)
+
+    started = time.monotonic()
+    finished = {}
+
+    def call(tenant, lane):
+        with scheduler.slot(tenant, lane, args.prompt_tokens) as usage:
+            text = client.chat(prompt, "stub")
+            usage["completion_tokens"] = len(text.split())
+        finished.setdefault(tenant, []).append(time.monotonic() - started)
+
+    with ThreadPoolExecutor(max_workers=len(calls)) as pool:
+        for future in [pool.submit(call, tenant, lane) for tenant, lane in calls]:
+            future.result()
+
+    for tenant, times in finished.items():
+        times.sort()
+        print(f"{tenant}: {len(times)} calls, first done at {times[0]:.2f}s, "
+              f"median {times[len(times) // 2]:.2f}s, last {times[-1]:.2f}s")
+    stats = scheduler.stats()
+    print(f"avg wait {stats['avg_wait_seconds']}, max wait {stats['max_wait_seconds']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
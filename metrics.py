@@ -0,0 +1,201 @@
+"""Stage-level timing and size instrumentation for pipeline runs
+
+Each run records per-stage wall time plus sizes (pages, characters,
+approximate prompt/completion tokens, bytes written). Finished stages are
+logged as JSON lines on the "glr.metrics" logger and folded into a
+process-wide registry that renders the Prometheus text format, written to
+GLR_METRICS_FILE and/or served on GLR_METRICS_PORT when those are set.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds (seconds) of the stage duration histogram buckets
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+logger = logging.getLogger("glr.metrics")
+
+
+class RunMetrics:
+    """Timings and sizes for one pipeline run"""
+
+    def __init__(self, run_id=None):
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.started = time.time()
+        self.stages = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, **sizes):
+        """Time a block; sizes can be added to the yielded dict inside it"""
+        record = {"stage": name, **sizes}
+        started = time.perf_counter()
+        try:
+            yield record
+            record["ok"] = True
+        except Exception:
+            record["ok"] = False
+            raise
+        finally:
+            record["seconds"] = round(time.perf_counter() - started, 4)
+            self.record(record)
+
+    def record(self, record):
+        """Add an already-measured stage"""
+        record.setdefault("ok", True)
+        with self._lock:
+            self.stages.append(record)
+        logger.info(json.dumps({"event": "stage", "run_id": self.run_id, **record}))
+        get_registry().observe(record)
+
+    def total_seconds(self):
+        return round(time.time() - self.started, 4)
+
+    def as_dict(self):
+        with self._lock:
+            return {"run_id": self.run_id, "total_seconds": self.total_seconds(), "stages": list(self.stages)}
+
+    def finish(self, status="ok"):
+        """Log the run summary and refresh the Prometheus file"""
+        summary = self.as_dict()
+        summary["status"] = status
+        logger.info(json.dumps({"event": "run", **summary}))
+        registry = get_registry()
+        registry.count_run(status)
+        registry.write_file()
+        return summary
+
+
+class MetricsRegistry:
+    """Process-wide aggregates of stage metrics in Prometheus form"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seconds = {}  # stage -> [bucket counts..., count, sum]
+        self._sizes = {}  # (stage, size) -> total
+        self._errors = {}
+        self._runs = {}
+        self._gauges = []
+
+    def observe(self, record):
+        stage = record["stage"]
+        seconds = record["seconds"]
+        with self._lock:
+            entry = self._seconds.setdefault(stage, [0] * len(BUCKETS) + [0, 0.0])
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    entry[i] += 1
+            entry[-2] += 1
+            entry[-1] += seconds
+            if not record.get("ok", True):
+                self._errors[stage] = self._errors.get(stage, 0) + 1
+            for name, value in record.items():
+                if name in ("stage", "ok") or name.endswith("seconds") or isinstance(value, bool):
+                    continue
+                if isinstance(value, (int, float)):
+                    self._sizes[(stage, name)] = self._sizes.get((stage, name), 0) + value
+
+    def add_gauge(self, name, help, collect):
+        """Export a gauge whose collect() returns [(labels dict, value), ...] at render time"""
+        with self._lock:
+            self._gauges.append((name, help, collect))
+
+    def count_run(self, status):
+        with self._lock:
+            self._runs[status] = self._runs.get(status, 0) + 1
+
+    def render(self):
+        """Prometheus text exposition format"""
+        lines = [
+            "# HELP glr_stage_seconds Wall time per pipeline stage",
+            "# TYPE glr_stage_seconds histogram",
+        ]
+        with self._lock:
+            for stage, entry in sorted(self._seconds.items()):
+                for bound, count in zip(BUCKETS, entry):
+                    lines.append(f'glr_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                lines.append(f'glr_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {entry[-2]}')
+                lines.append(f'glr_stage_seconds_count{{stage="{stage}"}} {entry[-2]}')
+                lines.append(f'glr_stage_seconds_sum{{stage="{stage}"}} {entry[-1]:.6f}')
+            lines += ["# HELP glr_stage_size_total Sizes processed per stage", "# TYPE glr_stage_size_total counter"]
+            for (stage, name), total in sorted(self._sizes.items()):
+                lines.append(f'glr_stage_size_total{{stage="{stage}",size="{name}"}} {total}')
+            lines += ["# HELP glr_stage_errors_total Failed stage executions", "# TYPE glr_stage_errors_total counter"]
+            for stage, count in sorted(self._errors.items()):
+                lines.append(f'glr_stage_errors_total{{stage="{stage}"}} {count}')
+            lines += ["# HELP glr_runs_total Completed pipeline runs", "# TYPE glr_runs_total counter"]
+            for status, count in sorted(self._runs.items()):
+                lines.append(f'glr_runs_total{{status="{status}"}} {count}')
+            gauges = list(self._gauges)
+        for name, help, collect in gauges:
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+            for labels, value in collect():
+                label_text = ",".join(f'{key}="{label}"' for key, label in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_file(self, path=None):
+        """Atomically write the exposition to GLR_METRICS_FILE, if configured"""
+        path = path or os.getenv("GLR_METRICS_FILE")
+        if not path:
+            return
+        partial = f"{path}.partial"
+        with open(partial, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(partial, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = get_registry().render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def _configure():
+    """Attach the JSON log handler and start the /metrics endpoint once per process"""
+    if not logger.handlers:
+        log_path = os.getenv("GLR_METRICS_LOG")
+        handler = logging.FileHandler(log_path) if log_path else logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+    port = os.getenv("GLR_METRICS_PORT", "").strip()
+    if port.isdigit():
+        try:
+            server = ThreadingHTTPServer(("0.0.0.0", int(port)), _MetricsHandler)
+        except OSError as e:
+            logger.warning(json.dumps({"event": "metrics_endpoint_failed", "error": str(e)}))
+            return
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+
+def get_registry():
+    """Process-wide metrics registry"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = MetricsRegistry()
+            _configure()
+        return _registry
@@ -0,0 +1,110 @@
+"""OCR fallback for report pages without a usable text layer
+
+Scanned photo report pages come back from PyPDF2 empty or as glyph
+garbage. Those pages alone are rasterized with pdftoppm and read with
+Tesseract (both from packages.txt) in a process pool. Each page is one
+pair of subprocess calls, so a worker handles a single page at a time.
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from doc_cache import content_hash
+from ingest import spool
+
+# Pages with fewer letters/digits than this are treated as having no text layer
+DEFAULT_MIN_CHARS = 20
+DEFAULT_DPI = 200
+DEFAULT_LANG = "eng"
+DEFAULT_TIMEOUT = 120
+
+
+def ocr_enabled():
+    """GLR_OCR is not switched off and both command-line tools are installed"""
+    if os.getenv("GLR_OCR", "auto").strip().lower() in ("0", "off", "false", "no"):
+        return False
+    return bool(shutil.which("pdftoppm") and shutil.which("tesseract"))
+
+
+def ocr_settings():
+    """DPI and Tesseract language from GLR_OCR_DPI / GLR_OCR_LANG"""
+    return int(os.getenv("GLR_OCR_DPI", DEFAULT_DPI)), os.getenv("GLR_OCR_LANG", DEFAULT_LANG)
+
+
+def needs_ocr(text, min_chars=None):
+    """True for pages with too little real text, or text that is mostly symbols"""
+    if min_chars is None:
+        min_chars = int(os.getenv("GLR_OCR_MIN_CHARS", DEFAULT_MIN_CHARS))
+    stripped = "".join(text.split())
+    letters = sum(1 for ch in stripped if ch.isalnum())
+    if letters < min_chars:
+        return True
+    # Broken font encodings extract as runs of punctuation and control characters
+    return letters < len(stripped) / 2
+
+
+def page_key(report_hash, page_index, dpi, lang):
+    """Cache digest for the OCR text of one page"""
+    return content_hash(f"{report_hash}:{page_index}:{dpi}:{lang}".encode("utf-8"))
+
+
+def _ocr_page(path, page_index, dpi, lang, timeout):
+    """Rasterize one page and return Tesseract's text; runs in a worker process"""
+    page = str(page_index + 1)
+    with tempfile.TemporaryDirectory(prefix="glr-ocr-") as tmp:
+        prefix = os.path.join(tmp, "page")
+        _run(["pdftoppm", "-f", page, "-l", page, "-r", str(dpi), "-gray", "-png", "-singlefile", path, prefix],
+             timeout)
+        # One page per process already saturates the pool; keep Tesseract single-threaded
+        env = dict(os.environ, OMP_THREAD_LIMIT="1")
+        return _run(["tesseract", prefix + ".png", "stdout", "-l", lang], timeout, env)
+
+
+def _run(command, timeout, env=None):
+    result = subprocess.run(command, capture_output=True, timeout=timeout, env=env)
+    if result.returncode != 0:
+        message = result.stderr.decode("utf-8", "replace").strip().splitlines()
+        raise RuntimeError(f"{command[0]} failed: {message[-1] if message else result.returncode}")
+    return result.stdout.decode("utf-8", "replace")
+
+
+def ocr_pages(items, workers=None, dpi=DEFAULT_DPI, lang=DEFAULT_LANG, progress=None, on_error=None):
+    """OCR (source, page_index) items in a process pool, returning texts in order
+
+    source is PDF bytes or a file path; bytes are spooled to a temporary
+    file because pdftoppm reads from disk. A page that fails yields "" and
+    is passed to on_error(item_index, exc); without on_error it raises.
+    progress(done, total) is called from the calling thread.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    timeout = float(os.getenv("GLR_OCR_TIMEOUT", DEFAULT_TIMEOUT))
+    results = [""] * len(items)
+    if not items:
+        return results
+
+    with tempfile.TemporaryDirectory(prefix="glr-ocr-src-") as tmp:
+        paths = {}
+        for source, _ in items:
+            if isinstance(source, (bytes, bytearray)) and id(source) not in paths:
+                paths[id(source)] = os.path.join(tmp, f"{len(paths):04d}.pdf")
+                spool(source, paths[id(source)])
+
+        with ProcessPoolExecutor(max_workers=max(1, min(workers, len(items)))) as pool:
+            futures = {
+                pool.submit(_ocr_page, paths.get(id(source), source), page_index, dpi, lang, timeout): n
+                for n, (source, page_index) in enumerate(items)
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
+                n = futures[future]
+                try:
+                    results[n] = future.result()
+                except Exception as e:
+                    if on_error is None:
+                        raise
+                    on_error(n, e)
+                if progress:
+                    progress(done, len(items))
+    return results
@@ -0,0 +1,115 @@
+"""Parallel PDF text extraction for photo reports"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from ingest import iter_pdf_pages, page_count
+from settings import default_workers
+
+# Upper bound on pages handed to a worker in one task; smaller chunks give
+# smoother progress, larger ones less scheduling overhead
+MAX_CHUNK_PAGES = 16
+
+# Per-process state for pool workers, set once by _init_worker
+_worker_reports = []
+
+
+def _init_worker(reports):
+    """Receive the reports (bytes or file paths) once per worker process instead of per task"""
+    global _worker_reports
+    _worker_reports = reports
+
+
+def _extract_range(report_index, start, end):
+    """Extract text for pages [start, end) of one report inside a worker
+
+    A fresh reader per range keeps a worker's memory bounded by the chunk,
+    not by everything it has parsed from the report so far.
+    """
+    return list(iter_pdf_pages(_worker_reports[report_index], start, end))
+
+
+def _chunk_size(total_pages, workers):
+    """Pick a chunk size giving each worker a few tasks to balance load"""
+    return max(1, min(MAX_CHUNK_PAGES, total_pages // (workers * 4) or 1))
+
+
+def extract_reports(reports, workers=None, progress=None, on_error=None):
+    """Extract page text from PDF reports, keeping report and page order
+
+    reports is a list of PDF bytes or file paths; paths are memory-mapped
+    rather than read into memory, and only the paths are sent to worker
+    processes. Returns one list of page strings per report.
+    progress(done_pages, total_pages) is called from the calling thread as
+    pages finish. A report that fails to parse yields an empty list and is
+    passed to on_error(index, exc); without on_error it raises.
+    """
+    if workers is None:
+        workers = default_workers()
+
+    results = [[] for _ in reports]
+    page_counts = []
+    for i, source in enumerate(reports):
+        try:
+            page_counts.append(page_count(source))
+        except Exception as e:
+            if on_error is None:
+                raise
+            on_error(i, e)
+            page_counts.append(0)
+
+    total = sum(page_counts)
+    if total == 0:
+        return results
+
+    if workers <= 1 or total == 1:
+        return _extract_serial(reports, page_counts, results, progress, on_error)
+
+    chunk = _chunk_size(total, workers)
+    done = 0
+    failed = set()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(reports,)) as pool:
+        futures = {}
+        for i, count in enumerate(page_counts):
+            results[i] = [""] * count
+            for start in range(0, count, chunk):
+                end = min(start + chunk, count)
+                futures[pool.submit(_extract_range, i, start, end)] = (i, start, end)
+
+        for future in as_completed(futures):
+            i, start, end = futures[future]
+            try:
+                results[i][start:end] = future.result()
+            except Exception as e:
+                if on_error is None:
+                    raise
+                if i not in failed:
+                    failed.add(i)
+                    on_error(i, e)
+            done += end - start
+            if progress:
+                progress(done, total)
+
+    for i in failed:
+        results[i] = []
+    return results
+
+
+def _extract_serial(reports, page_counts, results, progress, on_error):
+    """Single-process fallback, reporting progress after every page"""
+    total = sum(page_counts)
+    done = 0
+    for i, source in enumerate(reports):
+        if not page_counts[i]:
+            continue
+        try:
+            for text in iter_pdf_pages(source):
+                results[i].append(text)
+                done += 1
+                if progress:
+                    progress(done, total)
+        except Exception as e:
+            if on_error is None:
+                raise
+            on_error(i, e)
+            done += page_counts[i] - len(results[i])
+            results[i] = []
+    return results
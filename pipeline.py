@@ -0,0 +1,691 @@
+"""GLR pipeline: extract -> analyze -> prompt -> populate, independent of the UI"""
+import re
+import time
+
+from anchored_fill import build_anchor_prompt, parse_anchor_response, template_anchors
+from doc_cache import content_hash, get_cache
+from docx_io import read_docx
+from field_extract import get_extractor
+from ingest import iter_pdf_pages, source_hash, source_size
+from llm_cache import get_response_cache, response_key
+from llm_client import LLM_MAX_TOKENS, LLM_TEMPERATURE, iter_paragraphs
+from llm_router import TASK_FILL, TASK_STRUCTURE, get_router
+from llm_scheduler import LANE_INTERACTIVE, get_scheduler
+from metrics import RunMetrics
+from ocr import needs_ocr, ocr_enabled, ocr_pages, ocr_settings, page_key
+from pdf_extract import extract_reports
+from prompt_budget import assemble_prompt, prompt_budget
+from retrieval import ReportIndex, approx_tokens, clean_reports
+from section_fill import assemble_sections, fill_sections, section_evidence, split_sections
+from settings import FILL_ANCHORED, FILL_SECTIONS, FILL_SINGLE
+from template_classifier import get_classifier
+from template_model import ParsedTemplate, TemplateCell
+from template_registry import TemplateVersion, get_template_registry
+
+_ANCHOR = re.compile(r"p(\d+)$|t(\d+)r(\d+)c(\d+)$")
+
+
+def extract_text_from_pdf(pdf_file):
+    """Extract text from PDF file"""
+    return "".join(f"{text}\n" for text in iter_pdf_pages(pdf_file))
+
+
+def request_llm(prompt, api_key, task=TASK_FILL, tenant=None, lane=LANE_INTERACTIVE, validate=None):
+    """Call the best LLM backend for task, reusing cached and in-flight responses for identical prompts; raises on failure
+
+    Calls that miss the cache wait their turn in the scheduler's lane for
+    tenant. validate(text) may raise to reject a reply before it is cached,
+    so the next identical call asks the model again.
+    """
+    router = get_router()
+
+    def request_completion():
+        with get_scheduler().slot(tenant, lane, approx_tokens(prompt)) as usage:
+            text = router.chat(prompt, api_key, task, LLM_TEMPERATURE, LLM_MAX_TOKENS)
+            usage["completion_tokens"] = approx_tokens(text)
+        if validate:
+            validate(text)
+        return text
+
+    key = response_key(router.route_key(task), LLM_TEMPERATURE, LLM_MAX_TOKENS, prompt)
+    return get_response_cache().get_or_call(key, request_completion)
+
+
+def stream_llm(prompt, api_key, task=TASK_FILL, tenant=None, lane=LANE_INTERACTIVE):
+    """Stream LLM output paragraph by paragraph, caching the full response"""
+    router = get_router()
+    key = response_key(router.route_key(task), LLM_TEMPERATURE, LLM_MAX_TOKENS, prompt)
+    cached = get_response_cache().get(key)
+    if cached is not None:
+        yield from iter_paragraphs([cached])
+        return
+
+    chunks = []
+
+    def deltas():
+        # The scheduler slot is held until the stream ends
+        with get_scheduler().slot(tenant, lane, approx_tokens(prompt)) as usage:
+            for delta in router.stream_chat(prompt, api_key, task, LLM_TEMPERATURE, LLM_MAX_TOKENS):
+                chunks.append(delta)
+                yield delta
+            usage["completion_tokens"] = approx_tokens("".join(chunks))
+
+    yield from iter_paragraphs(deltas())
+    get_response_cache().put(key, "".join(chunks))
+
+
+def extract_template_content(template, prefilled=None):
+    """Extract full template as text, with the lines and cells in prefilled (anchor ID -> text) already filled"""
+    template = ParsedTemplate.load(template)
+    prefilled = prefilled or {}
+    full_text = [prefilled.get(para.anchor, para.text) for para in template.paragraphs]
+
+    for row_text in template.table_rows(prefilled):
+        full_text.append(" | ".join(row_text))
+
+    return "\n".join(full_text)
+
+
+def analyze_template_structure(template, classifier=None):
+    """Classify template paragraphs and table cells as HEADER, LABEL, INSTRUCTION or CONTENT
+
+    Returns a columnar TemplateStructure; see template_classifier for the
+    rules and how to add more.
+    """
+    return (classifier or get_classifier()).structure(ParsedTemplate.load(template))
+
+
+def fill_paragraph(para, text):
+    """Replace paragraph text, keeping the formatting of its first run"""
+    # Clear the text but keep formatting
+    for run in para.runs:
+        run.text = ""
+
+    # Add new text to first run (preserves formatting)
+    if para.runs:
+        para.runs[0].text = text
+    else:
+        para.add_run(text)
+
+
+def fill_cell(cell, text):
+    """Replace table cell text in its first paragraph, removing any others"""
+    paragraphs = cell.paragraphs
+    fill_paragraph(paragraphs[0], text)
+    for para in paragraphs[1:]:
+        para._p.getparent().remove(para._p)
+
+
+def fill_anchors(template, doc, values):
+    """Write anchor ID -> text values into doc, including empty table cells the template index leaves out"""
+    paragraphs = doc.paragraphs
+    for anchor, text in values.items():
+        m = _ANCHOR.match(anchor)
+        if m is None:
+            continue
+        if m.group(1) is not None:
+            fill_paragraph(paragraphs[int(m.group(1))], text)
+        else:
+            fill_cell(template.cell(doc, TemplateCell(int(m.group(2)), int(m.group(3)), int(m.group(4)), "")), text)
+
+
+def _template_paragraphs(template, doc):
+    """The python-docx paragraphs of doc that the template index marks as non-empty"""
+    paragraphs = doc.paragraphs
+    return [paragraphs[para.index] for para in template.paragraphs]
+
+
+def populate_template_smart(template, filled_content, prefilled=None):
+    """Populate template preserving ALL formatting
+
+    prefilled maps anchor IDs to text that replaces whatever the model
+    wrote for those lines, such as values read from the reports by rule.
+    """
+    template = ParsedTemplate.load(template)
+    doc = template.document()
+
+    # The filled_content is the complete text - we'll do intelligent replacement
+    # Split into paragraphs
+    new_paragraphs = [p.strip() for p in filled_content.split('\n') if p.strip()]
+
+    # Get all non-empty paragraphs from the template index
+    template_paragraphs = _template_paragraphs(template, doc)
+
+    # Replace content paragraph by paragraph, preserving formatting
+    for i, para in enumerate(template_paragraphs):
+        if i < len(new_paragraphs):
+            fill_paragraph(para, new_paragraphs[i])
+
+    # If there are more new paragraphs than template paragraphs, add them
+    if len(new_paragraphs) > len(template_paragraphs):
+        for i in range(len(template_paragraphs), len(new_paragraphs)):
+            doc.add_paragraph(new_paragraphs[i])
+
+    if prefilled:
+        fill_anchors(template, doc, prefilled)
+    return doc
+
+
+def populate_template_streaming(template, paragraphs, prefilled=None):
+    """Populate template as paragraphs arrive, yielding (doc, paragraph) after each one
+
+    Lines in prefilled (anchor ID -> text) are written first and keep that
+    text whatever the model streams for them.
+    """
+    template = ParsedTemplate.load(template)
+    doc = template.document()
+    template_paragraphs = _template_paragraphs(template, doc)
+    prefilled = prefilled or {}
+    fill_anchors(template, doc, prefilled)
+
+    # Same positional mapping as populate_template_smart, one paragraph at a time
+    for i, text in enumerate(paragraphs):
+        if i < len(template_paragraphs):
+            if template.paragraphs[i].anchor not in prefilled:
+                fill_paragraph(template_paragraphs[i], text)
+        else:
+            doc.add_paragraph(text)
+        yield doc, text
+
+
+def populate_template_anchored(template, values, prefilled=None):
+    """Populate template from an anchor ID -> text dict; anchors without a value keep their text
+
+    values may key blank table cells as well as indexed paragraphs and
+    cells (see template_anchors). Anchors in prefilled take its text over
+    the model's.
+    """
+    template = ParsedTemplate.load(template)
+    doc = template.document()
+    fill_anchors(template, doc, values)
+    if prefilled:
+        fill_anchors(template, doc, prefilled)
+    return doc
+
+
+def summarize_structure(template_structure):
+    """Create structure summary for AI; prompt assembly trims it to the token budget"""
+    lines = []
+    for s in template_structure:
+        where = f"Line {s['index']}" if "index" in s else f"Cell {s['id']}"
+        lines.append(f"{where}: [{s['type']}] {s['text'][:50]}...")
+    return "\n".join(lines)
+
+
+def build_structure_prompt(structure_summary, template_content):
+    """Prompt that has the AI learn the template structure first"""
+    return f"""You are analyzing an insurance GLR template structure.
+
+TEMPLATE STRUCTURE:
+{structure_summary}
+
+FULL TEMPLATE CONTENT:
+{template_content}
+
+Analyze this template and identify:
+1. What sections exist (e.g., Date of Loss, Insurable Interest, Dwelling Description, etc.)
+2. What information needs to be filled in each section
+3. What instructional text (in parentheses) needs to be replaced
+4. The order and hierarchy of sections
+
+Respond with a brief analysis of the template structure."""
+
+
+def build_fill_prompt(structure_analysis, template_content, report_evidence):
+    """Prompt that generates the completed report from the learned structure"""
+    return f"""You are an expert insurance claims adjuster. You must complete a General Loss Report (GLR) based on a template and photo inspection reports.
+
+YOUR UNDERSTANDING OF THE TEMPLATE STRUCTURE:
+{structure_analysis}
+
+ORIGINAL TEMPLATE (with instructions to follow):
+{template_content}
+
+PHOTO INSPECTION REPORTS (your source data):
+{report_evidence}
+
+YOUR TASK:
+Rewrite the ENTIRE GLR report by:
+1. Filling in ALL placeholders with actual data from the photo reports
+2. DELETING all instructional text in parentheses like "(one story, two story, etc.)" and replacing with actual values
+3. DELETING template instructions like "(Put N/A if...)" and "(Be sure to describe...)"
+4. Writing detailed, professional descriptions of damage based on the photo reports
+5. Including specific measurements, counts, and details from the reports
+6. Using proper insurance report language and formatting
+
+CRITICAL RULES:
+- MAINTAIN THE EXACT SAME STRUCTURE as the template (same sections, same order)
+- Each line should correspond to a paragraph in the template
+- Extract the CORRECT date of loss from the reports (not the inspection date)
+- Include full address with street, city, state, zip
+- Be specific about damage: include counts, locations, measurements
+- Delete ALL template instructions and parenthetical options
+- Write complete sentences in professional insurance language
+- For sections with no data (like Supplement, Priors), write "N/A" or appropriate professional response
+- Match the style and detail level of professional insurance adjusters
+- Keep section headers exactly as they are in the template
+
+FORMATTING:
+- Put each paragraph on a new line
+- Maintain the same number of sections as the template
+- Keep headers like "DwellingRoof", "Front Elevation", etc. exactly as in template
+
+Return the COMPLETE filled report as plain text, one paragraph per line."""
+
+
+def load_template(source, template_hash, cache=None):
+    """Parsed template, reused from the cache when the file is unchanged"""
+    cache = cache or get_cache()
+    template = cache.get("template", template_hash)
+    if template is None:
+        template = ParsedTemplate.from_bytes(source)
+        cache.put("template", template_hash, template)
+    return template
+
+
+def build_template_version(source, template_hash, cache=None):
+    """Everything the pipeline derives from a template alone, including the structure prompt"""
+    template = load_template(source, template_hash, cache)
+    template_content = extract_template_content(template)
+    template_structure = analyze_template_structure(template)
+    anchors = template_anchors(template, template_structure)
+    structure_summary = summarize_structure(template_structure)
+    structure_prompt, structure_usage = assemble_prompt(
+        lambda summary, template: build_structure_prompt(summary, template),
+        {"summary": (structure_summary, 0.3), "template": (template_content, 0.7)},
+        budget=prompt_budget(context_tokens=get_router().context_tokens(TASK_STRUCTURE))
+    )
+    return TemplateVersion(
+        template_hash,
+        template,
+        template_content,
+        template_structure,
+        structure_summary,
+        structure_prompt,
+        structure_usage,
+        anchors,
+        split_sections(template_structure.paragraphs(), [para.text for para in template.paragraphs]),
+        get_extractor().template_slots(template, anchors)
+    )
+
+
+def acquire_template(template, cache=None):
+    """(version, shared) from the template registry; hand the version back with get_template_registry().release()
+
+    template is .docx bytes, a binary file object (such as an upload) or a path.
+    """
+    source = read_docx(template)
+    template_hash = content_hash(source)
+    return get_template_registry().acquire(
+        template_hash,
+        lambda: build_template_version(source, template_hash, cache)
+    )
+
+
+def extract_report_pages(reports, pdf_workers=None, cache=None, progress=None, on_error=None, report_hashes=None):
+    """Page text for each (name, source) report, parsing only reports not already cached"""
+    cache = cache or get_cache()
+    if report_hashes is None:
+        report_hashes = [source_hash(source) for _, source in reports]
+    report_pages = [cache.get("pages", h) for h in report_hashes]
+    missing = [i for i, pages in enumerate(report_pages) if pages is None]
+    failed_reports = set()
+
+    def report_error(n, e):
+        failed_reports.add(n)
+        if on_error:
+            on_error(f"Error extracting PDF {reports[missing[n]][0]}: {str(e)}")
+
+    extracted = extract_reports(
+        [reports[i][1] for i in missing],
+        workers=pdf_workers,
+        progress=progress,
+        on_error=report_error
+    )
+    for n, i in enumerate(missing):
+        report_pages[i] = extracted[n]
+        if n not in failed_reports:
+            cache.put("pages", report_hashes[i], extracted[n])
+    return report_pages
+
+
+def ocr_report_pages(reports, report_pages, report_hashes, workers=None, cache=None, progress=None,
+                     on_error=None):
+    """OCR pages that have no usable text layer, in place; returns how many pages needed it
+
+    OCR text is cached per page, so a re-run or another claim sharing the
+    report only pays for pages it has not seen. Does nothing when OCR is
+    disabled or its tools are not installed.
+    """
+    if not ocr_enabled():
+        return 0
+    cache = cache or get_cache()
+    dpi, lang = ocr_settings()
+    candidates = 0
+    pending = []
+    for i, pages in enumerate(report_pages):
+        for n, text in enumerate(pages):
+            if not needs_ocr(text):
+                continue
+            candidates += 1
+            key = page_key(report_hashes[i], n, dpi, lang)
+            cached = cache.get("ocr", key)
+            if cached is None:
+                pending.append((i, n, key))
+            elif cached.strip():
+                pages[n] = cached
+
+    failed = set()
+
+    def page_error(k, e):
+        failed.add(k)
+        if on_error:
+            i, n, _ = pending[k]
+            on_error(f"OCR failed for {reports[i][0]} page {n + 1}: {str(e)}")
+
+    texts = ocr_pages(
+        [(reports[i][1], n) for i, n, _ in pending],
+        workers=workers,
+        dpi=dpi,
+        lang=lang,
+        progress=progress,
+        on_error=page_error
+    )
+    for k, ((i, n, key), text) in enumerate(zip(pending, texts)):
+        if k in failed:
+            continue
+        if text.strip():
+            report_pages[i][n] = text
+        cache.put("ocr", key, text)
+    return candidates
+
+
+def build_report_index(reports, report_pages, report_hashes):
+    """Index report pages so prompts carry the most relevant passages
+
+    Headers, footers, disclaimers and caption templates repeated across the
+    reports are indexed once, and near-duplicate pages are left out.
+    Returns (index, cleanup, sources), where cleanup is the clean_reports
+    stats dict and sources maps each page label to its (report_hash, page)
+    pair.
+    """
+    page_texts = []
+    sources = {}
+    cleaned, cleanup = clean_reports(report_pages)
+    for i, ((name, _), pages) in enumerate(zip(reports, cleaned)):
+        for n, page in enumerate(pages):
+            label = f"REPORT {i+1}: {name} - page {n+1}"
+            page_texts.append((label, page))
+            sources[label] = (report_hashes[i], n)
+    return ReportIndex.from_pages(page_texts), cleanup, sources
+
+
+def section_sources(sections, report_index, evidence, page_sources):
+    """Sorted (report_hash, page) pairs whose chunks match each section's text"""
+    return [
+        sorted({
+            page_sources[report_index.chunks[i][0]]
+            for i in report_index.matching("\n".join(section["lines"]), chunk_ids)
+        })
+        for section, chunk_ids in zip(sections, evidence)
+    ]
+
+
+def prefill_sections(sections, template, prefilled):
+    """Copies of sections with the paragraphs in prefilled (anchor ID -> text) already filled"""
+    if not prefilled:
+        return sections
+    lines = iter([prefilled.get(para.anchor, para.text).strip() for para in template.paragraphs])
+    return [{"title": section["title"], "lines": [next(lines) for _ in section["lines"]]} for section in sections]
+
+
+def run_claim(template, reports, api_key, fill_mode=FILL_SINGLE, stream=False, pdf_workers=None,
+              cache=None, progress=None, on_paragraph=None, on_error=None, metrics=None, claim_state=None,
+              tenant=None, lane=LANE_INTERACTIVE):
+    """Fill a GLR template from photo reports
+
+    template is .docx bytes, a binary file object or a path; it is read into
+    memory once and never copied to a temporary file. reports is a list of
+    (name, source) pairs, where source is PDF bytes or a file path; paths
+    are hashed and parsed without loading the whole file into memory.
+    progress(percent, message) tracks the run, on_paragraph(text) receives
+    each paragraph as it is streamed, and on_error(message) receives
+    problems that do not stop the run outright, such as an unreadable report
+    or a failed LLM call. Stage timings and sizes are recorded on metrics (a
+    RunMetrics) when given. In section-wise mode a ClaimState from the
+    claim's previous run lets sections whose source reports did not change
+    keep their text; it is updated in place. LLM calls are scheduled for
+    tenant (who the claim is run for) in lane. Returns (filled_doc,
+    llm_response); both are None if no report was generated.
+    """
+    metrics = metrics or RunMetrics()
+
+    def update(percent, message):
+        if progress:
+            progress(percent, message)
+
+    def warn(message):
+        if on_error:
+            on_error(message)
+
+    # Step 1: Analyze template structure, shared with other claims on the same template
+    update(15, "Analyzing template structure...")
+    registry = get_template_registry()
+    with metrics.stage("template_analysis") as stage:
+        version, shared = acquire_template(template, cache)
+        stage.update(
+            paragraphs=version.structure.paragraph_count,
+            cells=len(version.structure) - version.structure.paragraph_count,
+            chars=len(version.content),
+            shared=int(shared)
+        )
+    try:
+        return _fill_claim(version, reports, api_key, fill_mode, stream, pdf_workers, cache, metrics, update, warn,
+                           on_paragraph, claim_state, tenant, lane)
+    finally:
+        registry.release(version)
+
+
+def _fill_claim(version, reports, api_key, fill_mode, stream, pdf_workers, cache, metrics, update, warn,
+                on_paragraph, claim_state, tenant, lane):
+    """The rest of run_claim, holding a reference on the template version"""
+    template = version.template
+    template_content = version.content
+    template_structure = version.structure
+
+    # Extract from photo reports
+    update(35, f"Extracting from {len(reports)} report(s)...")
+    with metrics.stage("pdf_extraction", reports=len(reports)) as stage:
+        report_hashes = [source_hash(source) for _, source in reports]
+        report_pages = extract_report_pages(
+            reports,
+            pdf_workers=pdf_workers,
+            cache=cache,
+            progress=lambda done, total: update(
+                35 + int(10 * done / total),
+                f"Extracting from {len(reports)} report(s)... page {done}/{total}"
+            ),
+            on_error=warn,
+            report_hashes=report_hashes
+        )
+        stage.update(
+            pages=sum(len(pages) for pages in report_pages),
+            chars=sum(len(page) for pages in report_pages for page in pages),
+            input_bytes=sum(source_size(source) for _, source in reports)
+        )
+
+    # Scanned pages have no text layer; read them with OCR instead
+    with metrics.stage("ocr") as stage:
+        stage["pages"] = ocr_report_pages(
+            reports,
+            report_pages,
+            report_hashes,
+            workers=pdf_workers,
+            cache=cache,
+            progress=lambda done, total: update(45 + int(5 * done / total), f"Running OCR... page {done}/{total}"),
+            on_error=warn
+        )
+
+    # Values the rules read with enough confidence go into the report directly
+    with metrics.stage("field_extraction") as stage:
+        extractor = get_extractor()
+        fields = extractor.extract(report_pages)
+        prefilled = extractor.prefill(version.field_slots, fields)
+        stage.update(
+            fields=len(fields),
+            confident=sum(1 for field in fields.values() if field.confidence >= extractor.min_confidence),
+            slots=len(version.field_slots),
+            prefilled=len(prefilled)
+        )
+
+    with metrics.stage("retrieval") as stage:
+        report_index, cleanup, page_sources = build_report_index(reports, report_pages, report_hashes)
+        stage.update(
+            chunks=len(report_index.chunks),
+            report_tokens=report_index.total_tokens(),
+            **cleanup
+        )
+
+    # Step 2: Have AI learn the structure first
+    update(50, "AI learning template structure...")
+    with metrics.stage("structure_llm", **version.structure_usage) as stage:
+        try:
+            structure_analysis, shared = version.analysis(
+                lambda: request_llm(version.structure_prompt, api_key, TASK_STRUCTURE, tenant, lane)
+            )
+            stage.update(completion_tokens=approx_tokens(structure_analysis), shared=int(shared))
+        except Exception as e:
+            warn(f"LLM API Error: {str(e)}")
+            structure_analysis = None
+            stage["failed"] = 1
+
+    # Step 3: Generate content based on learned structure
+    update(65, "Generating completed report with AI...")
+    # Report evidence takes whatever the budget leaves after the template and analysis,
+    # and is only retrieved for the lines the model still has to write
+    queries = [
+        text for anchor, text in zip(template_structure.ids, template_structure.texts) if anchor not in prefilled
+    ] or [template_content]
+    evidence = {
+        "evidence": lambda tokens: report_index.retrieve_many(queries, tokens),
+        "evidence_tokens": report_index.total_tokens(),
+        "budget": prompt_budget(context_tokens=get_router().context_tokens(TASK_FILL)),
+    }
+    prompt = None
+    prompt_usage = {}
+    if fill_mode == FILL_ANCHORED:
+        # Prefilled anchors are left out, so the model does not write them
+        anchors = [anchor for anchor in version.anchors if anchor["id"] not in prefilled]
+        prompt, prompt_usage = assemble_prompt(
+            lambda analysis, evidence: build_anchor_prompt(analysis, anchors, evidence),
+            {"analysis": (structure_analysis or "", 0.15)},
+            **evidence
+        )
+    elif fill_mode != FILL_SECTIONS:
+        # The model rewrites the template line by line, so it is never cut; evidence shrinks instead
+        prompt, prompt_usage = assemble_prompt(
+            lambda analysis, template, evidence: build_fill_prompt(analysis, template, evidence),
+            {
+                "template": (extract_template_content(template, prefilled) if prefilled else template_content, None),
+                "analysis": (structure_analysis or "", 0.15)
+            },
+            **evidence
+        )
+        if prompt_usage["overflow_tokens"]:
+            warn(f"The template is {prompt_usage['overflow_tokens']} tokens over the prompt budget; "
+                 "filling it section by section instead")
+            fill_mode = FILL_SECTIONS
+            prompt = None
+            prompt_usage = {"overflow_tokens": prompt_usage["overflow_tokens"]}
+    filled_doc = None
+    llm_response = None
+    anchor_values = None
+
+    fill_started = time.perf_counter()
+    mode = {FILL_SECTIONS: "sections", FILL_ANCHORED: "anchored"}.get(fill_mode, "single")
+    with metrics.stage("fill_llm", mode=mode, **prompt_usage) as stage:
+        if fill_mode == FILL_SECTIONS:
+            # One smaller prompt per template section, run concurrently
+            sections = prefill_sections(version.sections, template, prefilled)
+            section_chunks = section_evidence(sections, report_index)
+            sources = section_sources(sections, report_index, section_chunks, page_sources)
+            # On a re-run, sections whose source reports are unchanged keep their text
+            reuse = claim_state.reusable(version.template_hash, report_hashes, sources) if claim_state else None
+            section_outputs, section_errors = fill_sections(
+                sections,
+                report_index,
+                structure_analysis,
+                lambda section_prompt: request_llm(section_prompt, api_key, TASK_FILL, tenant, lane),
+                progress=lambda done, total: update(65 + int(24 * done / total), f"Generating report sections... {done}/{total}"),
+                evidence=section_chunks,
+                reuse=reuse
+            )
+            for i, e in section_errors:
+                warn(f"LLM API Error in section \"{sections[i]['title']}\": {str(e)}")
+            if claim_state is not None:
+                claim_state.update(version.template_hash, report_hashes, sources, section_outputs)
+            if len(section_errors) < len(sections):
+                llm_response = assemble_sections(sections, section_outputs)
+            stage.update(
+                sections=len(sections),
+                reused=sum(1 for text in reuse or [] if text is not None),
+                failed=len(section_errors)
+            )
+        elif fill_mode == FILL_ANCHORED:
+            # One JSON answer keyed by anchor ID; a missing or extra key cannot shift other lines
+            try:
+                anchor_ids = [a["id"] for a in version.anchors]
+                # An unreadable reply is not cached, so pressing Process again asks the model again
+                llm_response = request_llm(prompt, api_key, TASK_FILL, tenant, lane,
+                                           validate=lambda text: parse_anchor_response(text, anchor_ids))
+                anchor_values = parse_anchor_response(llm_response, anchor_ids)
+                stage.update(anchors=len(anchors), filled=len(anchor_values))
+            except ValueError as e:
+                warn(f"Could not read the anchored response: {str(e)}")
+                llm_response = None
+                stage["failed"] = 1
+            except Exception as e:
+                warn(f"LLM API Error: {str(e)}")
+                stage["failed"] = 1
+        elif stream:
+            # Fill the template while the model is still writing
+            paragraphs = []
+            try:
+                for filled_doc, paragraph in populate_template_streaming(
+                        template, stream_llm(prompt, api_key, TASK_FILL, tenant, lane), prefilled
+                ):
+                    if not paragraphs:
+                        stage["first_paragraph_seconds"] = round(time.perf_counter() - fill_started, 4)
+                    paragraphs.append(paragraph)
+                    update(
+                        65 + min(24, int(24 * len(paragraphs) / max(template_structure.paragraph_count, 1))),
+                        "Generating completed report with AI..."
+                    )
+                    if on_paragraph:
+                        on_paragraph(paragraph)
+                llm_response = "\n".join(paragraphs)
+            except Exception as e:
+                warn(f"LLM API Error: {str(e)}")
+                filled_doc = None
+                stage["failed"] = 1
+        else:
+            try:
+                llm_response = request_llm(prompt, api_key, TASK_FILL, tenant, lane)
+            except Exception as e:
+                warn(f"LLM API Error: {str(e)}")
+                stage["failed"] = 1
+        stage["completion_tokens"] = approx_tokens(llm_response or "")
+    update(90, "Creating document...")
+
+    if not llm_response:
+        return None, None
+    if filled_doc is None:
+        with metrics.stage("populate") as stage:
+            if anchor_values is not None:
+                filled_doc = populate_template_anchored(template, anchor_values, prefilled)
+                stage["anchors"] = len(anchor_values)
+            else:
+                filled_doc = populate_template_smart(template, llm_response, prefilled)
+                stage["paragraphs"] = llm_response.count("\n") + 1
+            stage["prefilled"] = len(prefilled)
+    return filled_doc, llm_response
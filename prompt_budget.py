@@ -0,0 +1,105 @@
+"""Token-budgeted prompt assembly
+
+A prompt's budget is the model's context window minus the completion
+allowance, capped by GLR_PROMPT_TOKENS. The fixed instruction text is
+counted first, then any part that must stay whole (the template of a
+single-prompt fill). Other variable parts (structure analysis) are cut at
+line boundaries to their share of what is left, and report evidence fills
+the remainder, so the budget is used as fully as the evidence allows
+without overflowing the context.
+"""
+import os
+
+from llm_client import LLM_MAX_TOKENS, LLM_MODEL
+from retrieval import approx_tokens
+
+MODEL_CONTEXT_TOKENS = {
+    "llama-3.3-70b-versatile": 131072,
+    "llama-3.1-8b-instant": 131072,
+}
+DEFAULT_CONTEXT_TOKENS = 8192
+# Default cap on prompt size; the model allows far more, but every prompt
+# token counts against the API's per-minute token limit
+DEFAULT_PROMPT_TOKENS = 16000
+# Headroom for the gap between approx_tokens and the real tokenizer
+SAFETY_MARGIN = 0.05
+
+
+def prompt_budget(model=LLM_MODEL, max_tokens=LLM_MAX_TOKENS, context_tokens=None):
+    """Prompt tokens available for model (or a known context window), leaving room for max_tokens of completion"""
+    context = context_tokens or MODEL_CONTEXT_TOKENS.get(model, DEFAULT_CONTEXT_TOKENS)
+    window = int((context - max_tokens) * (1 - SAFETY_MARGIN))
+    cap = int(os.getenv("GLR_PROMPT_TOKENS", DEFAULT_PROMPT_TOKENS))
+    return max(0, min(cap, window))
+
+
+def fit_lines(text, token_budget):
+    """Leading whole lines of text within token_budget; returns (text, tokens)"""
+    kept = []
+    used = 0
+    for line in text.split("\n"):
+        cost = approx_tokens(line) + 1
+        if used + cost > token_budget:
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(kept), used
+
+
+def assemble_prompt(render, parts, evidence=None, evidence_tokens=0, budget=None):
+    """Render a prompt whose variable parts fit a token budget
+
+    render(**texts) builds the prompt from named texts. parts maps a name
+    to (text, share): a share of None keeps the whole text, reserved before
+    anything else; other parts keep their whole text when it fits, else are
+    cut to at least share of the tokens left after the fixed instructions
+    and whole parts, taking more when the evidence needs less than the
+    rest. evidence(tokens) returns report evidence within a budget and is
+    rendered as "evidence"; evidence_tokens is its full size. Returns
+    (prompt, usage), where usage has the token count of each part, the
+    total, the budget and overflow_tokens, how far the whole parts alone
+    exceed it (the prompt is then over budget).
+    """
+    if budget is None:
+        budget = prompt_budget()
+    names = list(parts) + (["evidence"] if evidence else [])
+    fixed = approx_tokens(render(**{name: "" for name in names}))
+    needs = {name: approx_tokens(text) for name, (text, _) in parts.items()}
+    whole = {name for name, (_, share) in parts.items() if share is None}
+    held = sum(needs[name] for name in whole)
+    available = max(0, budget - fixed - held)
+
+    shares = {name: share for name, (_, share) in parts.items() if name not in whole}
+    evidence_share = max(0.0, 1.0 - sum(shares.values())) if evidence else 0.0
+    reserve = min(evidence_tokens, int(available * evidence_share)) if evidence else 0
+
+    # Each part gets up to its share, then leftover room goes to parts in order
+    allocation = {name: min(needs[name], int(available * share)) for name, share in shares.items()}
+    allocation.update((name, needs[name]) for name in whole)
+    spare = available - reserve - sum(allocation[name] for name in shares)
+    for name in shares:
+        extra = max(0, min(needs[name] - allocation[name], spare))
+        allocation[name] += extra
+        spare -= extra
+
+    texts = {}
+    usage = {"budget": budget, "fixed_tokens": fixed, "truncated_parts": 0,
+             "overflow_tokens": max(0, fixed + held - budget)}
+    used = 0
+    for name, (text, _) in parts.items():
+        if needs[name] <= allocation[name]:
+            texts[name] = text
+            tokens = approx_tokens(text)
+        else:
+            texts[name], tokens = fit_lines(text, allocation[name])
+            usage["truncated_parts"] += 1
+        usage[f"{name}_tokens"] = tokens
+        if name not in whole:
+            used += tokens
+    if evidence:
+        texts["evidence"] = evidence(max(0, available - used))
+        usage["evidence_tokens"] = approx_tokens(texts["evidence"])
+
+    prompt = render(**texts)
+    usage["prompt_tokens"] = approx_tokens(prompt)
+    return prompt, usage
@@ -0,0 +1,453 @@
+"""Offline BM25 retrieval over report pages so prompts carry relevant evidence"""
+import re
+from collections import Counter
+
+import numpy as np
+
+DEFAULT_CHUNK_CHARS = 1200
+
+_TERM = re.compile(r"[a-z0-9][a-z0-9']+")
+# BPE vocabularies encode a common word (with its leading space) as one token,
+# digits in groups of up to three, and most punctuation marks and line breaks
+# on their own
+_TOKEN_PIECE = re.compile(r"[^\W\d_]+|\d{1,3}|[^\w\s]|_|\n+")
+_LONG_WORD = re.compile(r"[^\W\d_]{9,}")
+_NON_LETTERS = re.compile(r"[\W\d_]+")
+# Parts of template lines that change from page to page: dates, times, and page or photo counters
+_VARYING = re.compile(
+    r"\d{1,4}[/.-]\d{1,2}[/.-]\d{1,4}|\d{1,2}:\d{2}(?::\d{2})?(?:\s*[ap]\.?m\.?)?"
+    r"|\b(?:page|pg|photo|image|picture|img)\s*#?\s*\d+(?:\s*(?:of|/)\s*\d+)?|^\W*\d+(?:\s*(?:of|/)\s*\d+)?\W*$"
+)
+
+# Boilerplate and duplicate-page detection: body lines with at least this
+# many letters are candidates as well as page edges; near-duplicate lines
+# and pages are found with MinHash over character and word shingles
+MIN_BODY_LETTERS = 30
+LINE_SHINGLE_CHARS = 5
+LINE_SIMILARITY = 0.8
+MIN_PAGE_WORDS = 30
+PAGE_SHINGLE_WORDS = 3
+PAGE_SIMILARITY = 0.9
+MINHASH_PERMUTATIONS = 32
+LSH_BANDS = 8
+MINHASH_BLOCK_SHINGLES = 100000
+_MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+# Multiply-shift hash functions (a odd), one per permutation, from a fixed seed
+_MINHASH_A, _MINHASH_B = np.random.default_rng(31).integers(0, 1 << 64, size=(2, MINHASH_PERMUTATIONS),
+                                                              dtype=np.uint64, endpoint=False)
+_MINHASH_A |= np.uint64(1)
+
+_STOPWORDS = {
+    "the", "and", "for", "are", "but", "not", "you", "all", "any", "can", "had", "her", "was",
+    "one", "our", "out", "has", "his", "how", "its", "may", "who", "did", "yes", "with", "that",
+    "this", "from", "have", "were", "will", "there", "their", "which", "been", "into", "than",
+    "then", "them", "they", "what", "when", "where", "your", "sure", "describe", "enter",
+    "include", "each", "only", "also", "other", "put", "if", "of", "to", "in", "on", "at", "or",
+    "as", "is", "be", "by", "an", "it",
+}
+
+
+def approx_tokens(text):
+    """Token estimate used for budgeting, approximating a BPE tokenizer without loading one
+
+    Counts words, digit groups, punctuation marks and line breaks, plus one
+    extra token per eight letters of long words, which BPE splits into pieces.
+    """
+    if not text:
+        return 0
+    pieces = len(_TOKEN_PIECE.findall(text))
+    return pieces + sum((len(word) - 1) // 8 for word in _LONG_WORD.findall(text))
+
+
+def clean_reports(report_pages, edge_lines=3, min_share=0.5, line_similarity=LINE_SIMILARITY,
+                  page_similarity=PAGE_SIMILARITY):
+    """Strip boilerplate lines and near-duplicate pages from all of a claim's reports
+
+    report_pages holds one list of page texts per report. Candidate lines
+    are the first and last edge_lines of each page, plus longer lines
+    anywhere (disclaimers, photo caption templates). They are compared
+    ignoring case, spacing, dates, times and page or photo numbers, and
+    near-duplicates are grouped by MinHash over character shingles. A group
+    found on at least min_share of one report's pages, or of all pages (and
+    on at least three), is boilerplate; each distinct line of it is kept
+    where it first appears and removed where it repeats exactly (up to
+    case, spacing, dates, times and page or photo numbers), so similar
+    findings that differ in a word or a measurement all stay. Then a page is blanked when its
+    content, the lines outside every boilerplate group (including the
+    copies kept), has word shingles near-identical to an earlier page's, so
+    photo pages that share a long disclaimer but differ in their captions
+    are kept. Pages keep their positions so page numbers still hold.
+    page_similarity=None skips that step.
+
+    Returns (report_pages, stats) with stats {"boilerplate_lines",
+    "duplicate_pages", "chars_in", "chars_out", "reduction"}, reduction
+    being the share of characters removed.
+    """
+    split = [[[line for line in page.splitlines() if line.strip()] for page in pages] for pages in report_pages]
+    chars_in = sum(len(page) for pages in report_pages for page in pages)
+    total_pages = sum(len(pages) for pages in split)
+    removed = 0
+    content = split
+    if total_pages >= 3:
+        split, content, removed = _strip_lines(split, edge_lines, min_share, line_similarity, total_pages)
+    cleaned = [["\n".join(lines) for lines in pages] for pages in split]
+
+    duplicates = 0
+    if page_similarity is not None:
+        cleaned, duplicates = _blank_duplicate_pages(content, cleaned, page_similarity)
+    chars_out = sum(len(page) for pages in cleaned for page in pages)
+    return cleaned, {
+        "boilerplate_lines": removed,
+        "duplicate_pages": duplicates,
+        "chars_in": chars_in,
+        "chars_out": chars_out,
+        "reduction": round(1 - chars_out / chars_in, 4) if chars_in else 0.0,
+    }
+
+
+def _line_key(line):
+    return _VARYING.sub("#", " ".join(line.split()).lower())
+
+
+def _strip_lines(split, edge_lines, min_share, similarity, total_pages):
+    """(stripped, content, removed): pages without repeated boilerplate, and pages without any boilerplate line"""
+    # Candidate line positions per page, and each distinct candidate's key
+    candidates = []
+    keys = {}
+    for pages in split:
+        report = []
+        for lines in pages:
+            edges = set(range(min(edge_lines, len(lines)))) | set(range(max(0, len(lines) - edge_lines), len(lines)))
+            positions = {}
+            for n, line in enumerate(lines):
+                if n in edges or len(_NON_LETTERS.sub("", line)) >= MIN_BODY_LETTERS:
+                    positions[n] = keys.setdefault(_line_key(line), len(keys))
+            report.append(positions)
+        candidates.append(report)
+    if not keys:
+        return split, split, 0
+
+    group = near_duplicate_groups(minhash_signatures(*char_shingles(list(keys), LINE_SHINGLE_CHARS)), similarity)
+
+    # Pages each group appears on, overall and per report
+    threshold = max(3, min_share * total_pages)
+    boilerplate = set()
+    overall = Counter()
+    for report in candidates:
+        per_report = Counter()
+        for positions in report:
+            on_page = {int(group[key]) for key in positions.values()}
+            per_report.update(on_page)
+            overall.update(on_page)
+        report_threshold = max(3, min_share * len(report))
+        boilerplate.update(g for g, count in per_report.items() if count >= report_threshold)
+    boilerplate.update(g for g, count in overall.items() if count >= threshold)
+    if not boilerplate:
+        return split, split, 0
+
+    seen = set()
+    removed = 0
+    stripped = []
+    content = []
+    for pages, report in zip(split, candidates):
+        kept_pages = []
+        content_pages = []
+        for lines, positions in zip(pages, report):
+            kept = []
+            own = []
+            for n, line in enumerate(lines):
+                g = int(group[positions[n]]) if n in positions else None
+                if g in boilerplate:
+                    if positions[n] in seen:
+                        removed += 1
+                        continue
+                    seen.add(positions[n])
+                else:
+                    own.append(line)
+                kept.append(line)
+            kept_pages.append(kept)
+            content_pages.append(own)
+        stripped.append(kept_pages)
+        content.append(content_pages)
+    return stripped, content, removed
+
+
+def _blank_duplicate_pages(content, cleaned, similarity):
+    """Blank cleaned pages whose content lines are near-identical to an earlier page's"""
+    flat = [(r, n) for r, pages in enumerate(content) for n in range(len(pages))]
+    words = [_TERM.findall(" ".join(content[r][n]).lower()) for r, n in flat]
+    eligible = [i for i, page_words in enumerate(words) if len(page_words) >= MIN_PAGE_WORDS]
+    if len(eligible) < 2:
+        return cleaned, 0
+
+    shingle_ids, lengths = word_shingles([words[i] for i in eligible], PAGE_SHINGLE_WORDS)
+    group = near_duplicate_groups(minhash_signatures(shingle_ids, lengths), similarity)
+    cleaned = [list(pages) for pages in cleaned]
+    duplicates = 0
+    for row in np.flatnonzero(group != np.arange(len(eligible))):
+        r, n = flat[eligible[row]]
+        cleaned[r][n] = ""
+        duplicates += 1
+    return cleaned, duplicates
+
+
+def char_shingles(texts, size):
+    """Ids of every size-byte window of each text, as (ids, count per text)
+
+    Texts shorter than size are padded to one window. Ids are the window
+    bytes themselves, so no hashing is needed; size is at most 8.
+    """
+    encoded = [text.encode("utf-8").ljust(size) for text in texts]
+    text_bytes = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+    lengths = text_bytes - size + 1
+    blob = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64)
+    windows = np.zeros(len(blob) - size + 1, dtype=np.uint64)
+    for k in range(size):
+        windows = windows * np.uint64(256) + blob[k:len(blob) - size + 1 + k]
+    # Keep only windows that start and end inside the same text
+    starts = np.repeat(np.cumsum(text_bytes) - text_bytes, lengths)
+    offsets = np.arange(int(lengths.sum())) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return windows[starts + offsets], lengths
+
+
+def word_shingles(word_lists, size):
+    """Ids of every run of size words in each list, as (ids, count per list); lists must have at least size words"""
+    vocabulary = {}
+    word_ids = np.fromiter(
+        (vocabulary.setdefault(word, len(vocabulary)) for words in word_lists for word in words), dtype=np.uint64
+    )
+    list_words = np.fromiter(map(len, word_lists), dtype=np.int64, count=len(word_lists))
+    lengths = list_words - size + 1
+    runs = np.zeros(len(word_ids) - size + 1, dtype=np.uint64)
+    for k in range(size):
+        # Polynomial in the word ids; reduced each step, so it stays far below 2**64
+        runs = (runs * np.uint64(1000003) + word_ids[k:len(word_ids) - size + 1 + k]) % _MERSENNE_PRIME
+    starts = np.repeat(np.cumsum(list_words) - list_words, lengths)
+    offsets = np.arange(int(lengths.sum())) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return runs[starts + offsets], lengths
+
+
+def minhash_signatures(shingle_ids, lengths):
+    """MinHash signature (MINHASH_PERMUTATIONS values) per set, for sets given as (ids, count per set)
+
+    Permutations use fixed seeds, so signatures, and the prompts built
+    after deduplication, are the same in every process.
+    """
+    signatures = np.full((MINHASH_PERMUTATIONS, len(lengths)), np.iinfo(np.uint32).max, dtype=np.uint32)
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    first = 0
+    # Sets are hashed in blocks to bound the (permutations x shingles) intermediate
+    while first < len(lengths):
+        last = max(first + 1, int(np.searchsorted(ends, starts[first] + MINHASH_BLOCK_SHINGLES, side="right")))
+        # High 32 bits of a * id + b, wrapping modulo 2**64
+        values = np.multiply.outer(_MINHASH_A, shingle_ids[starts[first]:ends[last - 1]])
+        values += _MINHASH_B[:, None]
+        values >>= np.uint64(32)
+        nonempty = np.flatnonzero(lengths[first:last])
+        if len(nonempty):
+            block_starts = starts[first:last][nonempty] - starts[first]
+            signatures[:, first + nonempty] = np.minimum.reduceat(values.astype(np.uint32), block_starts, axis=1)
+        first = last
+    return np.ascontiguousarray(signatures.T)
+
+
+def near_duplicate_groups(signatures, similarity):
+    """Group per row: the lowest row it is linked to by estimated Jaccard similarity >= similarity
+
+    Candidate pairs come from locality-sensitive hashing over LSH_BANDS
+    bands of the signatures; each candidate is checked against the first
+    row of its bucket.
+    """
+    parent = np.arange(len(signatures))
+    rows = MINHASH_PERMUTATIONS // LSH_BANDS
+    for band in range(LSH_BANDS):
+        band_key = np.zeros(len(signatures), dtype=np.uint64)
+        for column in signatures[:, band * rows:(band + 1) * rows].T:
+            # Wrapping arithmetic is fine for a bucket key; members are verified below
+            band_key = band_key * np.uint64(1000003) + column
+        _, first_index, bucket = np.unique(band_key, return_index=True, return_inverse=True)
+        first = first_index[bucket.ravel()]
+        members = np.flatnonzero(first != np.arange(len(signatures)))
+        agree = (signatures[members] == signatures[first[members]]).mean(axis=1)
+        for i, j in zip(members[agree >= similarity], first[members[agree >= similarity]]):
+            a, b = _root(parent, i), _root(parent, j)
+            parent[max(a, b)] = min(a, b)
+    return np.array([_root(parent, i) for i in range(len(signatures))], dtype=np.int64)
+
+
+def _root(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def tokenize(text):
+    """Lowercased terms with stopwords dropped and a light plural stem"""
+    terms = []
+    for term in _TERM.findall(text.lower()):
+        if term in _STOPWORDS:
+            continue
+        if len(term) > 4 and term.endswith("s") and not term.endswith("ss"):
+            term = term[:-1]
+        terms.append(term)
+    return terms
+
+
+def chunk_pages(report_pages, max_chars=DEFAULT_CHUNK_CHARS):
+    """Split (label, page_text) pairs into paragraph-sized (label, text) chunks
+
+    Paragraphs (or lines, for paragraphs longer than max_chars) are packed
+    together up to max_chars. Chunks keep the label of their page.
+    """
+    chunks = []
+    for label, text in report_pages:
+        current = ""
+        for para in _units(text, max_chars):
+            if current and len(current) + len(para) + 1 > max_chars:
+                chunks.append((label, current))
+                current = ""
+            current = f"{current}\n{para}" if current else para
+        if current:
+            chunks.append((label, current))
+    return chunks
+
+
+def _units(text, max_chars):
+    """Paragraphs of a page, falling back to lines for oversized paragraphs"""
+    for para in re.split(r"\n\s*\n", text):
+        para = para.strip()
+        if len(para) <= max_chars:
+            if para:
+                yield para
+            continue
+        for line in para.split("\n"):
+            if line.strip():
+                yield line.strip()
+
+
+class ReportIndex:
+    """BM25 index over report chunks, stored as per-term posting arrays"""
+
+    def __init__(self, chunks, k1=1.5, b=0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        # Cost as formatted: the chunk, its line break and its page label line
+        self.tokens = np.array(
+            [approx_tokens(f"=== {label} ===\n{text}\n") for label, text in chunks], dtype=np.int64
+        )
+
+        postings = {}
+        lengths = np.zeros(len(chunks), dtype=np.float64)
+        for doc_id, (_, text) in enumerate(chunks):
+            terms = tokenize(text)
+            lengths[doc_id] = len(terms)
+            counts = {}
+            for term in terms:
+                counts[term] = counts.get(term, 0) + 1
+            for term, count in counts.items():
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(doc_id)
+                postings[term][1].append(count)
+
+        n_docs = max(len(chunks), 1)
+        avg_length = lengths.mean() if len(chunks) and lengths.mean() > 0 else 1.0
+        norm = k1 * (1 - b + b * lengths / avg_length)
+
+        # Precompute each term's BM25 contribution per document
+        self._postings = {}
+        for term, (doc_ids, counts) in postings.items():
+            doc_ids = np.array(doc_ids, dtype=np.int64)
+            tf = np.array(counts, dtype=np.float64)
+            idf = np.log(1 + (n_docs - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+            self._postings[term] = (doc_ids, idf * tf * (k1 + 1) / (tf + norm[doc_ids]))
+
+    @classmethod
+    def from_pages(cls, report_pages, max_chars=DEFAULT_CHUNK_CHARS):
+        """Build an index from (label, page_text) pairs"""
+        return cls(chunk_pages(report_pages, max_chars))
+
+    def scores(self, query):
+        """BM25 score of every chunk for a query"""
+        scores = np.zeros(len(self.chunks), dtype=np.float64)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is not None:
+                np.add.at(scores, posting[0], posting[1])
+        return scores
+
+    def search(self, query, k=8):
+        """Indices of the top-k matching chunks, best first"""
+        return self._top(self.scores(query), k)
+
+    @staticmethod
+    def _top(scores, k):
+        matched = np.flatnonzero(scores > 0)
+        if not len(matched):
+            return []
+        top = matched[np.argsort(-scores[matched], kind="stable")[:k]]
+        return top.tolist()
+
+    def total_tokens(self):
+        return int(self.tokens.sum())
+
+    def retrieve(self, query, token_budget, k=8):
+        """Top-k chunks for one query within token_budget, formatted for a prompt"""
+        return self.format(self.select([query], token_budget, k))
+
+    def retrieve_many(self, queries, token_budget, k=4):
+        """Evidence for several queries within one token budget, formatted for a prompt"""
+        return self.format(self.select(queries, token_budget, k))
+
+    def select(self, queries, token_budget, k=4):
+        """Chunk ids of the evidence for several queries within one token budget
+
+        Rankings are merged round-robin so every query contributes its best
+        chunks before any query gets its k-th; budget left after that goes
+        to the remaining chunks with the highest summed score. When the
+        whole index fits in the budget every chunk is returned. Ids come
+        back in report order.
+        """
+        if self.total_tokens() <= token_budget:
+            return list(range(len(self.chunks)))
+
+        query_scores = [self.scores(query) for query in queries if query.strip()]
+        rankings = [self._top(scores, k) for scores in query_scores]
+        chosen = set()
+        used = 0
+        for rank in range(k):
+            for ranking in rankings:
+                if rank >= len(ranking) or ranking[rank] in chosen:
+                    continue
+                cost = int(self.tokens[ranking[rank]])
+                if used + cost > token_budget:
+                    continue
+                chosen.add(ranking[rank])
+                used += cost
+
+        if query_scores:
+            for i in self._top(np.sum(query_scores, axis=0), len(self.chunks)):
+                cost = int(self.tokens[i])
+                if i not in chosen and used + cost <= token_budget:
+                    chosen.add(i)
+                    used += cost
+        return sorted(chosen)
+
+    def matching(self, query, chunk_ids):
+        """The chunk_ids that share at least one term with query"""
+        scores = self.scores(query)
+        return [i for i in chunk_ids if scores[i] > 0]
+
+    def format(self, chunk_ids):
+        """Render chunks grouped under their page labels"""
+        parts = []
+        last_label = None
+        for i in chunk_ids:
+            label, text = self.chunks[i]
+            if label != last_label:
+                parts.append(f"=== {label} ===")
+                last_label = label
+            parts.append(text)
+        return "\n".join(parts)
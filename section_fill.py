@@ -0,0 +1,109 @@
+"""Section-wise GLR fill: one small prompt per template section, run concurrently"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+DEFAULT_MAX_SECTIONS = 24
+DEFAULT_EXCERPT_TOKENS = 1500
+
+
+def split_sections(template_structure, paragraph_texts, max_sections=DEFAULT_MAX_SECTIONS):
+    """Group template paragraphs into sections that start at HEADER lines
+
+    template_structure is the output of analyze_template_structure and
+    paragraph_texts the full text of the same non-empty paragraphs, in order.
+    Returns a list of {"title", "lines"} dicts covering every paragraph once.
+    """
+    sections = []
+    for entry, text in zip(template_structure, paragraph_texts):
+        if entry["type"] == "HEADER" or not sections:
+            sections.append({"title": text.strip()[:80], "lines": []})
+        sections[-1]["lines"].append(text.strip())
+
+    # Merge the smallest neighbours until the call count is bounded
+    while len(sections) > max_sections:
+        i = min(range(len(sections) - 1), key=lambda n: len(sections[n]["lines"]) + len(sections[n + 1]["lines"]))
+        sections[i]["lines"].extend(sections.pop(i + 1)["lines"])
+    return sections
+
+
+def build_section_prompt(section, structure_analysis, excerpts):
+    """Prompt asking the model to rewrite exactly one section"""
+    count = len(section["lines"])
+    template_lines = "\n".join(section["lines"])
+    return f"""You are an expert insurance claims adjuster completing ONE section of a General Loss Report (GLR) based on photo inspection reports.
+
+YOUR UNDERSTANDING OF THE TEMPLATE STRUCTURE:
+{structure_analysis}
+
+TEMPLATE SECTION TO COMPLETE ({count} lines):
+{template_lines}
+
+RELEVANT PHOTO INSPECTION REPORT EXCERPTS (your source data):
+{excerpts or "(no matching report pages)"}
+
+YOUR TASK:
+Rewrite this section by filling in ALL placeholders with actual data from the report excerpts, replacing instructional text in parentheses with actual values, and writing detailed, professional descriptions with specific counts, locations and measurements.
+
+CRITICAL RULES:
+- Return EXACTLY {count} lines, one for each template line above, in the same order
+- Keep section headers exactly as they are in the template
+- Delete ALL template instructions and parenthetical options
+- For lines with no supporting data, write "N/A" or an appropriate professional response
+
+Return only the {count} completed lines as plain text, one per line."""
+
+
+def section_evidence(sections, report_index, excerpt_tokens=DEFAULT_EXCERPT_TOKENS):
+    """Chunk ids report_index ranks highest for each section, within excerpt_tokens"""
+    return [report_index.select(["\n".join(section["lines"])], excerpt_tokens, k=8) for section in sections]
+
+
+def fill_sections(sections, report_index, structure_analysis, call, max_workers=8,
+                  excerpt_tokens=DEFAULT_EXCERPT_TOKENS, progress=None, evidence=None, reuse=None):
+    """Run one LLM call per section concurrently
+
+    Each section's prompt carries the report chunks report_index ranks
+    highest for that section, within excerpt_tokens, or the chunk ids in
+    evidence[i] when given. Sections with text in reuse[i] are not sent to
+    the model and keep that text. call(prompt) returns the completion text
+    and may raise. Returns (outputs, errors): outputs[i] is the text for
+    section i or None when its call failed, and errors lists
+    (section_index, exception) pairs. progress(done, total) is called from
+    the calling thread for the sections actually generated.
+    """
+    if evidence is None:
+        evidence = section_evidence(sections, report_index, excerpt_tokens)
+    outputs = list(reuse) if reuse else [None] * len(sections)
+    prompts = {
+        i: build_section_prompt(section, structure_analysis, report_index.format(evidence[i]))
+        for i, section in enumerate(sections)
+        if outputs[i] is None
+    }
+    errors = []
+    if not prompts:
+        return outputs, errors
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(prompts)))) as pool:
+        futures = {pool.submit(call, prompt): i for i, prompt in prompts.items()}
+        for done, future in enumerate(as_completed(futures), start=1):
+            i = futures[future]
+            try:
+                outputs[i] = future.result()
+            except Exception as e:
+                errors.append((i, e))
+            if progress:
+                progress(done, len(prompts))
+    return outputs, errors
+
+
+def assemble_sections(sections, outputs):
+    """Join section outputs in template order, one line per template paragraph
+
+    Each section is padded or truncated to its own line count so a model
+    that adds or drops a line cannot shift later sections. Missing lines
+    and failed sections keep the template text.
+    """
+    lines = []
+    for section, output in zip(sections, outputs):
+        generated = [line.strip() for line in (output or "").split("\n") if line.strip()]
+        count = len(section["lines"])
+        lines.extend(generated[:count] + section["lines"][len(generated):count])
+    return "\n".join(lines)
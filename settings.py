@@ -0,0 +1,19 @@
+"""Options the apps need before the pipeline engine is loaded
+
+Kept free of heavy imports so the Streamlit page can render its widgets
+while python-docx, PyPDF2, NumPy and the pipeline are still loading.
+"""
+import os
+
+FILL_SINGLE = "Single prompt"
+FILL_SECTIONS = "Section-wise (parallel)"
+FILL_ANCHORED = "Anchored (JSON)"
+FILL_MODES = [FILL_SINGLE, FILL_SECTIONS, FILL_ANCHORED]
+
+
+def default_workers():
+    """Worker count from GLR_PDF_WORKERS, falling back to the CPU count"""
+    value = os.getenv("GLR_PDF_WORKERS", "").strip()
+    if value.isdigit() and int(value) > 0:
+        return int(value)
+    return os.cpu_count() or 1
@@ -0,0 +1,126 @@
+"""Lazy, once-per-process loading of the pipeline engine
+
+The Streamlit apps import only light modules at the top, so the page
+renders before python-docx, PyPDF2, NumPy, requests and the pipeline are
+imported. load_engine() imports them once per process and then runs the
+warm-up hooks (opening the caches, compiling the template classifier,
+starting the job queue) so the first claim does not pay for them; the apps
+call it through st.cache_resource. Each import and hook is timed as a
+"startup" run in the metrics log.
+
+import_report() breaks a fresh interpreter's import time down by top-level
+package, to keep cold starts fast:
+
+    python startup.py [--json] [module ...]
+"""
+import argparse
+import importlib
+import json
+import subprocess
+import sys
+import threading
+
+from metrics import RunMetrics
+
+# Imported in this order, so each library's own cost is measured before the
+# pipeline modules that pull it in
+ENGINE_MODULES = ("docx", "PyPDF2", "numpy", "requests", "pipeline", "jobs")
+WARM_UPS = (
+    ("parse_cache", "doc_cache", "get_cache"),
+    ("llm_cache", "llm_cache", "get_response_cache"),
+    ("llm_backends", "llm_router", "get_router"),
+    ("llm_scheduler", "llm_scheduler", "get_scheduler"),
+    ("template_registry", "template_registry", "get_template_registry"),
+    ("template_classifier", "template_classifier", "get_classifier"),
+    ("field_extractor", "field_extract", "get_extractor"),
+    ("job_queue", "jobs", "get_job_queue"),
+)
+
+_report = None
+_lock = threading.Lock()
+
+
+def load_engine():
+    """Import the engine and run the warm-up hooks once per process; returns the startup report
+
+    The report is {"total_seconds", "imports": [{"module", "seconds"}],
+    "warm_ups": [{"name", "seconds", "ok"}]}. A failing hook is logged and
+    skipped, since the same code runs again when a claim needs it.
+    """
+    global _report
+    with _lock:
+        if _report is not None:
+            return _report
+        metrics = RunMetrics(run_id="startup")
+        imports = []
+        for module in ENGINE_MODULES:
+            with metrics.stage("import", module=module) as stage:
+                importlib.import_module(module)
+            imports.append({"module": module, "seconds": stage["seconds"]})
+
+        warm_ups = []
+        for name, module, function in WARM_UPS:
+            try:
+                with metrics.stage("warm_up", hook=name) as stage:
+                    getattr(importlib.import_module(module), function)()
+            except Exception:
+                pass
+            warm_ups.append({"name": name, "seconds": stage["seconds"], "ok": stage["ok"]})
+
+        summary = metrics.finish("ok" if all(step["ok"] for step in warm_ups) else "failed")
+        _report = {"total_seconds": summary["total_seconds"], "imports": imports, "warm_ups": warm_ups}
+        return _report
+
+
+def import_report(modules=("streamlit",) + ENGINE_MODULES):
+    """Import time of modules in a fresh interpreter, per top-level package, slowest first
+
+    Parsed from python -X importtime, which attributes each module's own
+    time to it, so a library counts the same whichever module imports it
+    first. Returns {"total_seconds", "packages": [{"package", "seconds", "modules"}]}.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + ", ".join(modules)],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed")
+
+    packages = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|", 2)
+        if not self_us.strip().isdigit():
+            # The column header line
+            continue
+        entry = packages.setdefault(name.strip().split(".")[0], [0, 0])
+        entry[0] += int(self_us)
+        entry[1] += 1
+    rows = sorted(packages.items(), key=lambda item: item[1][0], reverse=True)
+    return {
+        "total_seconds": round(sum(us for us, _ in packages.values()) / 1e6, 4),
+        "packages": [{"package": name, "seconds": round(us / 1e6, 4), "modules": count}
+                     for name, (us, count) in rows],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Break down the import time of the app and pipeline by package")
+    parser.add_argument("modules", nargs="*", help="Modules to import (default: streamlit and the engine)")
+    parser.add_argument("--top", type=int, default=15, help="Packages listed in the text report")
+    parser.add_argument("--json", action="store_true", help="Print the full report as JSON")
+    args = parser.parse_args(argv)
+
+    report = import_report(tuple(args.modules) or ("streamlit",) + ENGINE_MODULES)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+    print(f"Total import time: {report['total_seconds']:.3f}s")
+    for row in report["packages"][:args.top]:
+        print(f"  {row['seconds']:8.3f}s  {row['package']} ({row['modules']} modules)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""Local OpenAI-compatible stub server for exercising the LLM client offline
+
+Run standalone:
+
+    python stub_llm_server.py --port 8800 --latency 0.5 --rate-limit-every 3
+
+then point the app at it with GLR_LLM_URL=http://127.0.0.1:8800/v1/chat/completions.
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ANCHOR_LINE = re.compile(r"^(p\d+|t\d+r\d+c\d+): \[", re.MULTILINE)
+
+
+class StubConfig:
+    """Behaviour knobs shared by all request handlers"""
+
+    def __init__(self, latency=0.0, token_delay=0.0, rate_limit_every=0, retry_after=1, fail_every=0, reply=None):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.fail_every = fail_every
+        self.reply = reply
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def next_request(self):
+        with self.lock:
+            self.requests += 1
+            return self.requests
+
+
+def stub_reply(prompt):
+    """Deterministic completion text derived from the prompt"""
+    anchors = ANCHOR_LINE.findall(prompt)
+    if anchors:
+        # Anchored fill prompt: answer with a JSON object keyed by anchor ID
+        return json.dumps({anchor: f"Stub value for {anchor}" for anchor in anchors})
+    lines = [line.strip() for line in prompt.splitlines() if line.strip()]
+    return "\n".join(f"Stub line {i + 1}: {line[:60]}" for i, line in enumerate(lines[:40]))
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = StubConfig()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, n, payload, content):
+        """Send the completion as server-sent events, one word per chunk"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        for word in content.split(" "):
+            chunk = {
+                "id": f"stub-{n}",
+                "object": "chat.completion.chunk",
+                "model": payload.get("model", "stub"),
+                "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(self.config.token_delay)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        config = self.config
+        n = config.next_request()
+
+        if config.rate_limit_every and n % config.rate_limit_every == 0:
+            self._send_json(429, {"error": {"message": "rate limited"}}, {"Retry-After": str(config.retry_after)})
+            return
+        if config.fail_every and n % config.fail_every == 0:
+            self._send_json(503, {"error": {"message": "unavailable"}})
+            return
+
+        time.sleep(config.latency)
+        prompt = "\n".join(m.get("content", "") for m in payload.get("messages", []))
+        content = config.reply(prompt) if config.reply else stub_reply(prompt)
+        if payload.get("stream"):
+            self._send_stream(n, payload, content)
+            return
+        time.sleep(config.token_delay * len(content.split()))
+        self._send_json(200, {
+            "id": f"stub-{n}",
+            "object": "chat.completion",
+            "model": payload.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": len(prompt) // 4,
+                "completion_tokens": len(content) // 4,
+                "total_tokens": (len(prompt) + len(content)) // 4
+            }
+        })
+
+
+def start_stub_server(port=0, **options):
+    """Start a stub server in a background thread; returns (server, url)"""
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"config": StubConfig(**options)})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/v1/chat/completions"
+    return server, url
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Seconds per generated word")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="Answer every Nth request with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429")
+    parser.add_argument("--fail-every", type=int, default=0, help="Answer every Nth request with 503")
+    args = parser.parse_args()
+
+    server, url = start_stub_server(
+        port=args.port,
+        latency=args.latency,
+        token_delay=args.token_delay,
+        rate_limit_every=args.rate_limit_every,
+        retry_after=args.retry_after,
+        fail_every=args.fail_every
+    )
+    print(f"Stub LLM listening on {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""Rule-based classification of template paragraphs and table cells
+
+Rules are tried in order and the first that matches a line decides its
+type; lines no rule matches are CONTENT. All paragraph and cell texts are
+joined into one newline-separated string and classified in a batch:
+pattern rules are compiled into one multi-line regex, one named
+alternative per rule, matched once per line, and word rules into one
+alternation of literals that is searched across the whole string, with
+hits mapped back to lines. The result is columnar (TemplateStructure)
+rather than a dict per line.
+
+Extra rules come from GLR_TEMPLATE_RULES, a JSON list (or the path of a
+JSON file) of entries such as
+
+    {"type": "HEADER", "words": ["Garage", "Fence"]}
+    {"type": "SIGNATURE", "pattern": "(?i:adjuster signature)"}
+
+and take priority over the defaults. A "pattern" is matched at the start
+of the stripped text (use .* to search and $ to anchor the end), "words"
+matches any of the words anywhere, and {"uppercase": true} matches text
+whose letters are all capitals. Patterns must not define named groups,
+and flags must be scoped, as in (?i:...).
+"""
+import json
+import os
+import re
+import threading
+
+import numpy as np
+
+CONTENT = "CONTENT"
+DEFAULT_HEADER_WORDS = ("Dwelling", "Roof", "Elevation", "Interior", "Contents", "Review")
+DEFAULT_RULES = (
+    {"type": "LABEL", "pattern": r".*:$"},
+    {"type": "HEADER", "uppercase": True},
+    {"type": "HEADER", "words": DEFAULT_HEADER_WORDS},
+    {"type": "INSTRUCTION", "pattern": r"\(.*\)$"},
+)
+# Characters of each line kept in the structure for prompts
+TEXT_CHARS = 100
+
+
+class TemplateStructure:
+    """Classified template lines in columns: paragraphs in document order, then table cells
+
+    codes indexes types; is_cell, index (paragraph position, -1 for cells)
+    and table/row/col (-1 for paragraphs) are NumPy arrays; ids, texts and
+    styles are lists. Iterating yields one dict per line, as
+    {"id", "index", "type", "style", "text"} for paragraphs and
+    {"id", "table", "row", "col", "type", "text"} for cells.
+    """
+
+    __slots__ = ("types", "codes", "is_cell", "index", "table", "row", "col", "ids", "texts", "styles")
+
+    def __init__(self, types, codes, is_cell, index, table, row, col, ids, texts, styles):
+        self.types = types
+        self.codes = codes
+        self.is_cell = is_cell
+        self.index = index
+        self.table = table
+        self.row = row
+        self.col = col
+        self.ids = ids
+        self.texts = texts
+        self.styles = styles
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __iter__(self):
+        return (self.entry(i) for i in range(len(self.codes)))
+
+    @property
+    def paragraph_count(self):
+        return int(len(self.codes) - self.is_cell.sum())
+
+    def type_of(self, i):
+        return self.types[self.codes[i]]
+
+    def entry(self, i):
+        if self.is_cell[i]:
+            return {
+                "id": self.ids[i],
+                "table": int(self.table[i]),
+                "row": int(self.row[i]),
+                "col": int(self.col[i]),
+                "type": self.type_of(i),
+                "text": self.texts[i],
+            }
+        return {
+            "id": self.ids[i],
+            "index": int(self.index[i]),
+            "type": self.type_of(i),
+            "style": self.styles[i],
+            "text": self.texts[i],
+        }
+
+    def paragraphs(self):
+        """Paragraph entries, in the order of ParsedTemplate.paragraphs"""
+        return [self.entry(i) for i in range(self.paragraph_count)]
+
+    def cells(self):
+        """Cell entries, in the order of ParsedTemplate.cells"""
+        return [self.entry(i) for i in range(self.paragraph_count, len(self.codes))]
+
+    def counts(self):
+        """Number of lines of each type"""
+        counts = np.bincount(self.codes, minlength=len(self.types))
+        return {name: int(n) for name, n in zip(self.types, counts) if n}
+
+
+class TemplateClassifier:
+    """Ordered classification rules compiled into a line regex and a word regex"""
+
+    def __init__(self, rules=DEFAULT_RULES):
+        rules = list(rules)
+        self.types = tuple(dict.fromkeys([rule["type"] for rule in rules] + [CONTENT]))
+        # Type code per rule, plus CONTENT for lines no rule matches
+        self._rule_codes = np.array([self.types.index(rule["type"]) for rule in rules] + [self.types.index(CONTENT)],
+                                    dtype=np.uint8)
+        self._no_match = len(rules)
+        uppercase = [n for n, rule in enumerate(rules) if rule.get("uppercase")]
+        self._uppercase_rule = uppercase[0] if uppercase else None
+
+        line_rules = []
+        word_rules = []
+        self._group_rules = {}
+        for n, rule in enumerate(rules):
+            if "pattern" in rule:
+                line_rules.append(f"(?P<r{n}>{rule['pattern']})")
+            elif "words" in rule:
+                # Longest first, so a word is not cut short by a shorter one it starts with
+                words = sorted(rule["words"], key=len, reverse=True)
+                word_rules.append(f"(?P<r{n}>{'|'.join(re.escape(word) for word in words)})")
+            else:
+                continue
+            self._group_rules[f"r{n}"] = n
+        alternation = f"(?:{'|'.join(line_rules)})?" if line_rules else ""
+        self._line_pattern = re.compile(f"^{alternation}.*$", re.MULTILINE)
+        self._word_pattern = re.compile("|".join(word_rules)) if word_rules else None
+        # Rule per regex group number, so a match maps to its rule through m.lastindex
+        groups = max(self._line_pattern.groups, self._word_pattern.groups if self._word_pattern else 0)
+        self._line_group_rules = self._index_rules(self._line_pattern, groups)
+        self._word_group_rules = self._index_rules(self._word_pattern, groups) if self._word_pattern else None
+
+    def _index_rules(self, pattern, groups):
+        rules = np.full(groups + 1, self._no_match, dtype=np.int32)
+        for name, number in pattern.groupindex.items():
+            rules[number] = self._group_rules[name]
+        return rules
+
+    def classify(self, texts):
+        """Type codes (indexes into self.types) for a list of stripped texts"""
+        if not texts:
+            return np.zeros(0, dtype=np.uint8)
+        blob = "\n".join(texts)
+        if blob.count("\n") != len(texts) - 1:
+            texts = [text.replace("\n", " ") for text in texts]
+            blob = "\n".join(texts)
+
+        # One match per line; lastindex is the outermost rule group that matched, None for no rule
+        groups = np.fromiter((m.lastindex or 0 for m in self._line_pattern.finditer(blob)), dtype=np.int32)
+        if len(groups) != len(texts):
+            # A pattern consumed a line break; fall back to one match per line
+            groups = np.fromiter((self._line_pattern.match(text).lastindex or 0 for text in texts), dtype=np.int32,
+                                 count=len(texts))
+        rule = self._line_group_rules[groups]
+
+        if self._word_pattern is not None:
+            hits = [(m.start(), m.lastindex) for m in self._word_pattern.finditer(blob)]
+            if hits:
+                lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts)) + 1
+                starts = np.cumsum(lengths) - lengths
+                positions, hit_groups = np.array(hits, dtype=np.int64).T
+                lines = np.searchsorted(starts, positions, side="right") - 1
+                np.minimum.at(rule, lines, self._word_group_rules[hit_groups])
+
+        if self._uppercase_rule is not None:
+            upper = np.fromiter(map(str.isupper, texts), dtype=bool, count=len(texts))
+            rule = np.where(upper & (self._uppercase_rule < rule), self._uppercase_rule, rule)
+        return self._rule_codes[rule]
+
+    def structure(self, template):
+        """Classify every paragraph and table cell of a ParsedTemplate in one pass"""
+        paragraphs = template.paragraphs
+        cells = template.cells
+        texts = [para.text.strip() for para in paragraphs] + [cell.text.strip() for cell in cells]
+        n_paragraphs = len(paragraphs)
+        is_cell = np.zeros(len(texts), dtype=bool)
+        is_cell[n_paragraphs:] = True
+        missing = np.full(len(cells), -1, dtype=np.int32)
+        return TemplateStructure(
+            self.types,
+            self.classify(texts),
+            is_cell,
+            np.concatenate([np.fromiter((p.index for p in paragraphs), dtype=np.int32, count=n_paragraphs), missing]),
+            np.concatenate([np.full(n_paragraphs, -1, dtype=np.int32),
+                            np.fromiter((c.table for c in cells), dtype=np.int32, count=len(cells))]),
+            np.concatenate([np.full(n_paragraphs, -1, dtype=np.int32),
+                            np.fromiter((c.row for c in cells), dtype=np.int32, count=len(cells))]),
+            np.concatenate([np.full(n_paragraphs, -1, dtype=np.int32),
+                            np.fromiter((c.col for c in cells), dtype=np.int32, count=len(cells))]),
+            [para.anchor for para in paragraphs] + [cell.anchor for cell in cells],
+            [text[:TEXT_CHARS] for text in texts],
+            [para.style for para in paragraphs] + [None] * len(cells),
+        )
+
+
+def load_rules(spec=None):
+    """GLR_TEMPLATE_RULES-style JSON list or file path, ahead of the default rules"""
+    spec = spec if spec is not None else os.getenv("GLR_TEMPLATE_RULES", "").strip()
+    if not spec:
+        return list(DEFAULT_RULES)
+    if not spec.lstrip().startswith("["):
+        with open(spec, encoding="utf-8") as f:
+            spec = f.read()
+    return json.loads(spec) + list(DEFAULT_RULES)
+
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+
+def get_classifier():
+    """Process-wide classifier, compiled once"""
+    global _classifier
+    with _classifier_lock:
+        if _classifier is None:
+            _classifier = TemplateClassifier(load_rules())
+        return _classifier
@@ -0,0 +1,146 @@
+"""Single-parse template model shared by content extraction, analysis and population"""
+from io import BytesIO
+
+from docx import Document
+from docx.table import _Cell
+from docx.text.paragraph import Paragraph
+
+from docx_io import read_docx
+
+
+class TemplateParagraph:
+    """A non-empty body paragraph: position in doc.paragraphs, text and style name"""
+
+    __slots__ = ("index", "text", "style")
+
+    def __init__(self, index, text, style):
+        self.index = index
+        self.text = text
+        self.style = style
+
+    @property
+    def anchor(self):
+        """Stable ID used to key structured fills, e.g. p12"""
+        return f"p{self.index}"
+
+    def __getstate__(self):
+        return (self.index, self.text, self.style)
+
+    def __setstate__(self, state):
+        self.index, self.text, self.style = state
+
+
+class TemplateCell:
+    """A distinct table cell (merged cells appear once) and its text"""
+
+    __slots__ = ("table", "row", "col", "text")
+
+    def __init__(self, table, row, col, text):
+        self.table = table
+        self.row = row
+        self.col = col
+        self.text = text
+
+    @property
+    def anchor(self):
+        """Stable ID used to key structured fills, e.g. t0r2c1"""
+        return f"t{self.table}r{self.row}c{self.col}"
+
+    def __getstate__(self):
+        return (self.table, self.row, self.col, self.text)
+
+    def __setstate__(self, state):
+        self.table, self.row, self.col, self.text = state
+
+
+class ParsedTemplate:
+    """Paragraph and table index built from one load of a .docx
+
+    Picklable, so it can be cached and shared across claims; document()
+    returns a fresh, editable python-docx Document for population.
+    """
+
+    __slots__ = ("source", "paragraphs", "cells")
+
+    def __init__(self, source, paragraphs, cells):
+        self.source = source
+        self.paragraphs = paragraphs
+        self.cells = cells
+
+    def __getstate__(self):
+        return (self.source, self.paragraphs, self.cells)
+
+    def __setstate__(self, state):
+        self.source, self.paragraphs, self.cells = state
+
+    @classmethod
+    def from_bytes(cls, source):
+        """Parse .docx bytes once into a paragraph/cell index"""
+        doc = Document(BytesIO(source))
+        style_names = {}
+        paragraphs = []
+        for index, p in enumerate(doc.element.body.p_lst):
+            para = Paragraph(p, doc._body)
+            text = para.text
+            if not text.strip():
+                continue
+            # Resolving a style walks the styles part, so do it once per style id
+            style_id = p.style
+            if style_id not in style_names:
+                style_names[style_id] = para.style.name if para.style else "Normal"
+            paragraphs.append(TemplateParagraph(index, text, style_names[style_id]))
+
+        # Walk <w:tc> elements directly: row.cells expands merged cells into
+        # repeated grid positions, which is slow on large merged tables
+        cells = []
+        for t, table in enumerate(doc.tables):
+            for r, tr in enumerate(table._tbl.tr_lst):
+                for c, tc in enumerate(tr.tc_lst):
+                    text = _Cell(tc, table).text
+                    if text.strip():
+                        cells.append(TemplateCell(t, r, c, text))
+
+        return cls(source, paragraphs, cells)
+
+    @classmethod
+    def load(cls, source):
+        """Accept a ParsedTemplate, .docx bytes, a path or a binary file object"""
+        if isinstance(source, cls):
+            return source
+        return cls.from_bytes(read_docx(source))
+
+    def document(self):
+        """A fresh Document loaded from the template bytes"""
+        return Document(BytesIO(self.source))
+
+    def cell(self, doc, cell):
+        """The python-docx cell of doc (a document() copy) that a TemplateCell indexes"""
+        table = doc.tables[cell.table]
+        return _Cell(table._tbl.tr_lst[cell.row].tc_lst[cell.col], table)
+
+    def blank_cells(self):
+        """Empty cells right of or below a cell with text, where a form expects a value
+
+        The index leaves empty cells out, so this reads the document again;
+        the TemplateCells returned have empty text.
+        """
+        filled = {(cell.table, cell.row, cell.col) for cell in self.cells}
+        blanks = []
+        for t, table in enumerate(self.document().tables):
+            for r, tr in enumerate(table._tbl.tr_lst):
+                for c in range(len(tr.tc_lst)):
+                    if (t, r, c) not in filled and ((t, r, c - 1) in filled or (t, r - 1, c) in filled):
+                        blanks.append(TemplateCell(t, r, c, ""))
+        return blanks
+
+    def table_rows(self, values=None):
+        """Cell texts grouped per table row, in document order; values (anchor ID -> text) overrides cells"""
+        values = values or {}
+        rows = []
+        key = None
+        for cell in self.cells:
+            if (cell.table, cell.row) != key:
+                key = (cell.table, cell.row)
+                rows.append([])
+            rows[-1].append(values.get(cell.anchor, cell.text))
+        return rows
@@ -0,0 +1,151 @@
+"""Server-wide registry of analyzed template versions, keyed by content hash
+
+Many adjusters fill the same GLR template, so everything derived from a
+template alone is kept once per process: the parsed template, its text,
+structure, anchors, sections and field slots, the structure prompt, and the LLM
+structure analysis, which the first claim computes and later claims reuse. Versions in use by a run are
+reference counted and never evicted; idle versions are evicted least
+recently used first once the registry exceeds its entry or size limit.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 32
+DEFAULT_MAX_MB = 64
+
+
+class TemplateVersion:
+    """Claim-independent state for one template file"""
+
+    def __init__(self, template_hash, template, content, structure, summary, structure_prompt, structure_usage,
+                 anchors, sections, field_slots):
+        self.template_hash = template_hash
+        self.template = template
+        self.content = content
+        self.structure = structure
+        self.summary = summary
+        self.structure_prompt = structure_prompt
+        self.structure_usage = structure_usage
+        self.anchors = anchors
+        self.sections = sections
+        self.field_slots = field_slots
+        self.structure_analysis = None
+        self.refs = 0
+        self._analysis_lock = threading.Lock()
+
+    def size(self):
+        """Approximate memory held, dominated by the .docx bytes and prompt text"""
+        text = len(self.content) + len(self.summary) + len(self.structure_prompt) + len(self.structure_analysis or "")
+        return len(self.template.source) + text + 200 * (len(self.structure) + len(self.template.cells))
+
+    def analysis(self, analyze):
+        """Structure analysis from analyze(), run by the first caller and shared with the rest
+
+        Returns (analysis, shared). Concurrent callers wait for the first
+        one; a failed or empty analysis is not kept, so the next claim
+        retries it.
+        """
+        if self.structure_analysis is not None:
+            return self.structure_analysis, True
+        with self._analysis_lock:
+            if self.structure_analysis is not None:
+                return self.structure_analysis, True
+            analysis = analyze()
+            if analysis:
+                self.structure_analysis = analysis
+            return analysis, False
+
+
+class TemplateRegistry:
+    """Thread-safe, reference-counted LRU of TemplateVersion objects"""
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        if max_entries is None:
+            max_entries = int(os.getenv("GLR_TEMPLATE_REGISTRY_SIZE", DEFAULT_MAX_ENTRIES))
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv("GLR_TEMPLATE_REGISTRY_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._versions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, template_hash, build):
+        """(version, shared) for template_hash, building the version with build() on a miss
+
+        shared is True when the version already existed. Every acquire must
+        be paired with a release() once the caller is done with the version.
+        """
+        with self._lock:
+            version = self._versions.get(template_hash)
+            if version is not None:
+                self.hits += 1
+                version.refs += 1
+                self._versions.move_to_end(template_hash)
+                return version, True
+
+        # Build outside the lock; if two sessions race, the first one stored wins
+        built = build()
+        with self._lock:
+            version = self._versions.setdefault(template_hash, built)
+            if version is built:
+                self.misses += 1
+            else:
+                self.hits += 1
+            version.refs += 1
+            self._versions.move_to_end(template_hash)
+            self._evict()
+            return version, version is not built
+
+    def release(self, version):
+        """Drop a reference taken by acquire()"""
+        with self._lock:
+            version.refs = max(0, version.refs - 1)
+            self._evict()
+
+    def clear(self):
+        """Drop every version not currently in use"""
+        with self._lock:
+            for template_hash in [h for h, version in self._versions.items() if not version.refs]:
+                del self._versions[template_hash]
+
+    def _evict(self):
+        total = sum(version.size() for version in self._versions.values())
+        for template_hash in list(self._versions):
+            if len(self._versions) <= self.max_entries and total <= self.max_bytes:
+                break
+            version = self._versions[template_hash]
+            if version.refs:
+                continue
+            total -= version.size()
+            del self._versions[template_hash]
+            self.evictions += 1
+
+    def stats(self):
+        """Counters for the sidebar"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._versions),
+                "in_use": sum(1 for version in self._versions.values() if version.refs),
+                "analyzed": sum(1 for version in self._versions.values() if version.structure_analysis),
+                "bytes": sum(version.size() for version in self._versions.values()),
+            }
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_template_registry():
+    """Process-wide registry shared by all Streamlit sessions, like an st.cache_resource value"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = TemplateRegistry()
+        return _registry
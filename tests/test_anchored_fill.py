@@ -0,0 +1,50 @@
+from io import BytesIO
+
+from docx import Document
+
+from anchored_fill import build_anchor_prompt, parse_anchor_response, template_anchors
+from llm_client import LLMClient
+from pipeline import populate_template_anchored
+from stub_llm_server import start_stub_server
+from template_classifier import get_classifier
+from template_model import ParsedTemplate
+
+
+def _roof_template():
+    doc = Document()
+    doc.add_paragraph("Roof")
+    table = doc.add_table(rows=2, cols=2)
+    table.cell(0, 0).text = "Roof Type"
+    table.cell(1, 0).text = "Number of Layers"
+    out = BytesIO()
+    doc.save(out)
+    return ParsedTemplate.from_bytes(out.getvalue())
+
+
+def test_blank_value_cells_are_anchors():
+    template = _roof_template()
+    anchors = template_anchors(template, get_classifier().structure(template))
+
+    assert [a["id"] for a in anchors] == ["p0", "t0r0c0", "t0r1c0", "t0r0c1", "t0r1c1"]
+    prompt = build_anchor_prompt("", anchors, "")
+    assert "t0r0c1: [CONTENT] (empty)" in prompt
+
+
+def test_blank_cell_filled_end_to_end():
+    template = _roof_template()
+    anchors = template_anchors(template, get_classifier().structure(template))
+    ids = [a["id"] for a in anchors]
+    server, url = start_stub_server()
+    client = LLMClient(url)
+    try:
+        text = client.chat(build_anchor_prompt("", anchors, "Roof: 3-tab asphalt shingle, 1 layer"), "test-key")
+    finally:
+        client.close()
+        server.shutdown()
+        server.server_close()
+
+    doc = populate_template_anchored(template, parse_anchor_response(text, ids), prefilled={"t0r0c0": "Roof Type"})
+    table = doc.tables[0]
+    assert table.cell(0, 0).text == "Roof Type"
+    assert table.cell(0, 1).text == "Stub value for t0r0c1"
+    assert table.cell(1, 1).text == "Stub value for t0r1c1"
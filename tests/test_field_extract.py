@@ -0,0 +1,51 @@
+from io import BytesIO
+
+from docx import Document
+
+from anchored_fill import template_anchors
+from field_extract import FieldExtractor
+from template_classifier import get_classifier
+from template_model import ParsedTemplate
+
+
+def _template(paragraphs):
+    doc = Document()
+    for text in paragraphs:
+        doc.add_paragraph(text)
+    out = BytesIO()
+    doc.save(out)
+    template = ParsedTemplate.from_bytes(out.getvalue())
+    return template, template_anchors(template, get_classifier().structure(template))
+
+
+def test_name_stops_at_column_gap_and_next_label():
+    extractor = FieldExtractor()
+    for line in ("Insured: John Smith   Phone: 555-123-4567",
+                 "Insured: John Smith\tPhone: 555-123-4567",
+                 "Insured: John Smith Phone: 555-123-4567"):
+        fields = extractor.extract([[line]])
+        assert fields["insured"].text == "John Smith", line
+
+
+def test_policy_holder_and_insured_address_labels():
+    fields = FieldExtractor().extract([[
+        "Policy Holder: Mary Jones\n"
+        "Insured Address: 1420 Oak Ridge Dr, Springfield, IL 62704\n"
+        "Policy #: HO3-4451902"
+    ]])
+    assert fields["insured"].text == "Mary Jones"
+    assert fields["address"].text == "1420 Oak Ridge Dr, Springfield, IL 62704"
+    assert fields["policy_number"].text == "HO3-4451902"
+
+
+def test_policy_holder_and_insured_address_slots():
+    extractor = FieldExtractor()
+    template, anchors = _template(["Policy Holder: ____", "Insured Address: (street, city, state, zip)",
+                                   "Policy Number:", "(Enter policy number)"])
+    slots = {slot["field"]: slot for slot in extractor.template_slots(template, anchors)}
+
+    assert slots["insured"]["prefix"] == "Policy Holder: "
+    assert slots["address"]["prefix"] == "Insured Address: "
+    # A label line followed by a placeholder line fills the placeholder
+    assert slots["policy_number"]["anchor"] == anchors[3]["id"]
+    assert slots["policy_number"]["prefix"] == ""
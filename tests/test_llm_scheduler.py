@@ -0,0 +1,52 @@
+import threading
+import time
+
+from llm_client import LLMClient
+from llm_scheduler import LANE_BATCH, LANE_INTERACTIVE, LLMScheduler
+from stub_llm_server import start_stub_server
+
+
+def _queue_then_release(calls):
+    """Queue calls (tenant, lane) one by one behind a held slot, release it, and return the admission order"""
+    server, url = start_stub_server(latency=0.01)
+    client = LLMClient(url)
+    scheduler = LLMScheduler(max_in_flight=1)
+    order = []
+
+    def call(tenant, lane):
+        with scheduler.slot(tenant, lane, 100) as usage:
+            order.append(tenant)
+            usage["completion_tokens"] = len(client.chat(f"Prompt for {tenant}", "stub").split())
+
+    try:
+        held = scheduler.slot("holder")
+        held.__enter__()
+        threads = []
+        for n, (tenant, lane) in enumerate(calls):
+            thread = threading.Thread(target=call, args=(tenant, lane))
+            thread.start()
+            threads.append(thread)
+            while sum(scheduler.stats()["queued"].values()) < n + 1:
+                time.sleep(0.001)
+        held.__exit__(None, None, None)
+        for thread in threads:
+            thread.join(10)
+    finally:
+        client.close()
+        server.shutdown()
+        server.server_close()
+    return order
+
+
+def test_light_tenant_is_not_starved_by_heavy_one():
+    order = _queue_then_release([("heavy", LANE_INTERACTIVE)] * 8 + [("light", LANE_INTERACTIVE)] * 2)
+
+    assert len(order) == 10
+    # Queued last, the light tenant's calls alternate with the heavy tenant's instead of waiting for all eight
+    assert max(i for i, tenant in enumerate(order) if tenant == "light") <= 3
+
+
+def test_interactive_lane_goes_before_batch():
+    order = _queue_then_release([("batch", LANE_BATCH)] * 3 + [("app", LANE_INTERACTIVE)] * 2)
+
+    assert order == ["app", "app", "batch", "batch", "batch"]
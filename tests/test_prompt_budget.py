@@ -0,0 +1,26 @@
+from prompt_budget import assemble_prompt
+
+
+def _render(template, evidence):
+    return f"Template:\n{template}\nEvidence:\n{evidence}"
+
+
+def test_whole_part_is_kept_and_evidence_shrinks():
+    template = "\n".join(f"Section {n}: describe the damage here" for n in range(200))
+    evidence = "\n".join(f"Report line {n} with some detail" for n in range(400))
+    prompt, usage = assemble_prompt(
+        _render, {"template": (template, None)},
+        evidence=lambda tokens: evidence[:tokens * 4], evidence_tokens=len(evidence) // 4, budget=3000
+    )
+    assert template in prompt
+    assert usage["truncated_parts"] == 0
+    assert usage["overflow_tokens"] == 0
+    assert usage["prompt_tokens"] <= 3000
+
+
+def test_whole_part_over_budget_reports_overflow():
+    template = "\n".join(f"Section {n}: describe the damage here" for n in range(200))
+    prompt, usage = assemble_prompt(_render, {"template": (template, None)},
+                                    evidence=lambda tokens: "", budget=500)
+    assert template in prompt
+    assert usage["overflow_tokens"] > 0
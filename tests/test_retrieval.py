@@ -0,0 +1,53 @@
+from retrieval import clean_reports
+
+DISCLAIMER = (
+    "This report was prepared by ACME Inspections for the sole use of the carrier. Findings are based on a "
+    "visual inspection from accessible areas only and do not constitute an engineering opinion or a guarantee "
+    "of condition. Hidden damage may exist that was not visible at the time of inspection."
+)
+
+
+def _page(n, *lines):
+    return "\n".join(["ACME Inspections", f"Page {n} of 6", *lines, DISCLAIMER])
+
+
+def test_similar_findings_survive():
+    findings = [
+        "Right Elevation shows hail damage to the gutters and downspouts",
+        "Rear Elevation shows hail damage to the gutters and downspouts",
+        "Left Elevation shows hail damage to the gutters and downspouts",
+        "Front Elevation shows hail damage to the gutters and downspouts",
+    ]
+    pages = [_page(n + 1, finding) for n, finding in enumerate(findings)]
+    cleaned, stats = clean_reports([pages])
+
+    for page, finding in zip(cleaned[0], findings):
+        assert finding in page
+    # The header and disclaimer are kept once
+    assert sum(page.count(DISCLAIMER) for page in cleaned[0]) == 1
+    assert stats["boilerplate_lines"] > 0
+
+
+def test_photo_pages_sharing_a_disclaimer_are_not_duplicates():
+    captions = [
+        "Right elevation: 3 dented gutters",
+        "Left elevation: no damage observed",
+        "Front elevation: 2 cracked window wraps",
+        "Rear elevation: torn window screen",
+    ]
+    pages = [_page(n + 1, f"Photo {n + 1}", caption) for n, caption in enumerate(captions)]
+    cleaned, stats = clean_reports([pages])
+
+    assert stats["duplicate_pages"] == 0
+    for page, caption in zip(cleaned[0], captions):
+        assert caption in page
+
+
+def test_near_duplicate_pages_are_blanked():
+    body = " ".join(f"Slope {n} shows granule loss and bruised shingles near the ridge line." for n in range(6))
+    pages = [_page(1, "Summary", body), _page(2, "Photo 1", "Front elevation: no damage"), _page(3, "Summary", body)]
+    cleaned, stats = clean_reports([pages])
+
+    assert stats["duplicate_pages"] == 1
+    assert cleaned[0][2] == ""
+    assert body in cleaned[0][0]